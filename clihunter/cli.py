@@ -1,10 +1,14 @@
 # clihunter/cli.py
 import typer
+import os
+import re
 import subprocess
 import sys
 import time
-from typing import List, Optional, Dict, Any
+import concurrent.futures
+from typing import List, Optional, Dict, Any, Tuple
 from typing_extensions import Annotated
+from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TaskProgressColumn
 
 # Import other modules from the project
 from . import config
@@ -31,6 +35,10 @@ app = typer.Typer(
     rich_markup_mode="markdown"
 )
 
+# CJK (Han, Hiragana/Katakana, Hangul) detection: if a description contains
+# none of these, it is already usable English and needs no LLM translation.
+_CJK_RE = re.compile(r'[\u4e00-\u9fff\u3400-\u4dbf\u3040-\u30ff\uac00-\ud7af]')
+
 _SYNONYM_MAP_INSTANCE: Optional[Dict[str, List[str]]] = None
 
 def _get_or_load_synonyms() -> Dict[str, List[str]]:
@@ -44,6 +52,143 @@ def _get_or_load_synonyms() -> Dict[str, List[str]]:
             _SYNONYM_MAP_INSTANCE = {}
     return _SYNONYM_MAP_INSTANCE
 
+def _make_progress() -> Progress:
+    """
+    Progress bar for the batch LLM loops: renders are coalesced to 4Hz so
+    bursts of completed futures don't turn into terminal I/O, and the bar is
+    cleared (transient) once done.
+    """
+    return Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        TaskProgressColumn(),
+        refresh_per_second=4,
+        transient=True
+    )
+
+
+def _display_results_with_fzf(results: List[models.CommandEntry]) -> Optional[models.CommandEntry]:
+    """
+    Let the user pick one of the search results with a single fzf invocation.
+    Each line carries the entry id as its first ' ::: '-delimited field; fzf
+    hides it with --with-nth=2.. and we recover the selection by splitting the
+    chosen line, so no second fzf run is needed to extract the id.
+    """
+    if not results:
+        return None
+
+    id_to_entry = {entry.id: entry for entry in results}
+
+    def _format_line(entry: models.CommandEntry) -> bytes:
+        desc = (entry.description or "").replace("\n", " ")
+        return f"{entry.id} ::: {entry.raw_command} :: {desc}\n".encode('utf-8')
+
+    fzf_cmd = [
+        config.FZF_EXECUTABLE,
+        "--ansi",
+        "--delimiter", " ::: ",
+        "--with-nth", "2..",
+        "--height", "40%", "--layout=reverse", "--border",
+    ]
+    try:
+        # Stream one encoded line per entry straight into fzf's stdin: the
+        # full candidate list is never materialized as a joined blob, so peak
+        # memory stays bounded no matter how many results FTS returns.
+        process = subprocess.Popen(
+            fzf_cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            bufsize=64 * 1024
+        )
+        try:
+            for entry in results:
+                process.stdin.write(_format_line(entry))
+            process.stdin.close()
+        except BrokenPipeError:
+            pass  # fzf can exit before consuming all input (e.g. instant pick)
+        stdout_bytes = process.stdout.read()
+        process.wait()
+    except FileNotFoundError:
+        typer.secho(f"❌ fzf executable '{config.FZF_EXECUTABLE}' not found in PATH.", fg=typer.colors.RED)
+        return None
+
+    if process.returncode != 0 or not stdout_bytes.strip():
+        return None  # Cancelled or nothing selected
+
+    selected_line_content = stdout_bytes.strip().splitlines()[-1].decode('utf-8', errors='replace')
+    selected_id = selected_line_content.split(' ::: ', 1)[0]
+    return id_to_entry.get(selected_id)
+
+
+def _dedupe_latest(entries: List[history_parser.HistoryEntry]) -> List[history_parser.HistoryEntry]:
+    """
+    Deduplicate history entries by command text, keeping the entry with the
+    newest timestamp. Single forward pass with one dict probe per entry.
+    """
+    unique: Dict[str, history_parser.HistoryEntry] = {}
+    for entry in entries:
+        cmd = entry.command.strip()
+        if not cmd:
+            continue
+        prev = unique.get(cmd)
+        if prev is None or (entry.timestamp or 0) > (prev.timestamp or 0):
+            unique[cmd] = entry
+    return list(unique.values())
+
+
+def _iter_commands_to_process(
+    raw_history_entries: List[history_parser.HistoryEntry],
+    db_raw_command_ids: Dict[str, str],
+    force_reparse: bool = False,
+    exclude_help_like: bool = False,
+):
+    """
+    Fused dedupe -> filter pipeline over raw history entries, shared by
+    init-history and sync. Yields cmd_info dicts ({raw_command, timestamp})
+    one at a time, so no intermediate list is materialized between the
+    stages; peak memory is just the dedup dict. No add-vs-update
+    classification happens here: the force path writes through an SQL upsert
+    and lets ON CONFLICT resolve it per row.
+    """
+    min_len = config.MIN_COMMAND_LENGTH
+    is_excluded = utils.is_excluded_prefix
+    for entry in _dedupe_latest(raw_history_entries):
+        cmd_text = entry.command
+        if len(cmd_text) < min_len or is_excluded(cmd_text):
+            continue
+        if exclude_help_like and "help" in cmd_text:
+            continue
+        if force_reparse or cmd_text not in db_raw_command_ids:
+            yield {"raw_command": cmd_text, "timestamp": entry.timestamp}
+
+
+def _enrich_command_with_llm(
+    raw_cmd: str,
+    fetch_context: bool = True
+) -> Tuple[Optional[str], Optional[str], Dict[str, Optional[str]]]:
+    """
+    Worker for one command: gather shell context (optional), then run the two
+    LLM calls (description, then command-from-description).
+    Runs inside a thread pool, so it must not touch typer output.
+    Returns (description, processed_command, command_context).
+    """
+    base_cmd_for_context = utils.get_base_command(raw_cmd)
+    command_context_data: Dict[str, Optional[str]] = {"which_info": "N/A", "help_info": "N/A", "man_info": "N/A"}
+    if fetch_context and base_cmd_for_context:
+        command_context_data = utils.get_command_context(raw_cmd)
+
+    english_description = llm_handler.generate_description(
+        raw_cmd,
+        base_command_for_context=(base_cmd_for_context or raw_cmd),
+        command_context=command_context_data
+    )
+    english_processed_command = None
+    if english_description:
+        english_processed_command = llm_handler.generate_command_from_description(english_description)
+    return english_description, english_processed_command, command_context_data
+
+
 # --- CLI command ---
 @app.command(name="initdb", help="Initialize database and table structure (if they don't exist).")
 def init_db_command():
@@ -72,125 +217,119 @@ def init_history_command(
         return
 
     typer.echo(f"Raw history entries: {len(raw_history_entries)}")
-    unique_history_commands_map: Dict[str, history_parser.HistoryEntry] = {}
-    for entry in reversed(raw_history_entries):
-        raw_cmd_text = entry.get("command", "").strip()
-        if raw_cmd_text:
-            if raw_cmd_text not in unique_history_commands_map or \
-               (entry.get("timestamp") and (unique_history_commands_map[raw_cmd_text].get("timestamp") is None or \
-                entry.get("timestamp", 0) > unique_history_commands_map[raw_cmd_text].get("timestamp", 0))):
-                unique_history_commands_map[raw_cmd_text] = entry
-    
-    candidate_commands_from_history: List[history_parser.HistoryEntry] = list(unique_history_commands_map.values())
-    typer.echo(f"Unique commands after deduplication: {len(candidate_commands_from_history)}")
-
-    filtered_history_commands: List[history_parser.HistoryEntry] = []
-    for entry in candidate_commands_from_history:
-        cmd_text = entry.get("command", "")
-        base_command = utils.get_base_command(cmd_text)
-        if cmd_text and \
-           len(cmd_text) >= config.MIN_COMMAND_LENGTH and \
-           base_command not in config.DEFAULT_COMMAND_EXCLUSION_LIST and \
-               "help" not in cmd_text:
-            filtered_history_commands.append(entry)
-    
-    typer.echo(f"After excluding simple/short commands: {len(filtered_history_commands)}")
-    if not filtered_history_commands:
-        typer.secho("🤷 No eligible commands to process.", fg=typer.colors.YELLOW)
-        return
-
-    commands_to_process_final: List[Dict[str, Any]] = []
-    db_raw_commands_set = set()
-    if not force_reparse_all:
-        db_raw_commands_set = set(database.get_all_raw_commands())
-        typer.echo(f"Database already contains {len(db_raw_commands_set)} raw commands.")
-
-    for hist_entry in filtered_history_commands:
-        raw_cmd = hist_entry.get("command", "")
-        timestamp = hist_entry.get("timestamp")
-        if force_reparse_all:
-            existing_db_entry = database.get_command_by_raw_command(raw_cmd)
-            op_type = "UPDATE" if existing_db_entry else "ADD"
-            existing_id = existing_db_entry.id if existing_db_entry else None
-            commands_to_process_final.append({"raw_command": raw_cmd, "timestamp": timestamp, "operation": op_type, "existing_id": existing_id})
-        elif raw_cmd not in db_raw_commands_set:
-            commands_to_process_final.append({"raw_command": raw_cmd, "timestamp": timestamp, "operation": "ADD", "existing_id": None})
-    
-    num_to_add = sum(1 for cmd in commands_to_process_final if cmd['operation'] == 'ADD')
-    num_to_update = sum(1 for cmd in commands_to_process_final if cmd['operation'] == 'UPDATE')
-
-    if not commands_to_process_final:
-        typer.secho("🤷 No new commands or commands requiring forced update to process.", fg=typer.colors.YELLOW)
-        return
 
-    typer.echo(f"Ready to process commands -> New: {num_to_add}, Update: {num_to_update}")
-    if not yes and not typer.confirm(f"About to process {len(commands_to_process_final)} commands with LLM (New:{num_to_add}, Update:{num_to_update}). Continue?"):
-        typer.echo("Operation cancelled.")
-        raise typer.Exit()
-
-    processed_count = 0; llm_errors = 0; db_success_add = 0; db_success_update = 0
-    with typer.progressbar(commands_to_process_final, label="Processing commands...", length=len(commands_to_process_final)) as progress:
-        for cmd_info in progress:
-            raw_cmd = cmd_info["raw_command"]
-
-            base_cmd_for_context = utils.get_base_command(raw_cmd)
-            command_context_data = {"which_info": "N/A", "help_info": "N/A", "man_info": "N/A"}
-            if base_cmd_for_context:
-                command_context_data = utils.get_command_context(raw_cmd) 
-
-            english_description = llm_handler.generate_description(
-                raw_cmd,
-                base_command_for_context=(base_cmd_for_context or raw_cmd),
-                command_context=command_context_data
-            )
-            if not english_description:
-                typer.secho(f"  Can't generate English description for '{raw_cmd[:30]}...', skipping.", fg=typer.colors.YELLOW)
-                llm_errors += 1
-                continue
-
-            english_processed_command = llm_handler.generate_command_from_description(english_description)
-            # Default None if not generated
-            if not english_processed_command:
-                 typer.secho(f"  Failed to generate English command from description for '{raw_cmd[:30]}...', processed_command will be empty.", fg=typer.colors.YELLOW)
-
-
-            entry_data = {
-                "id": cmd_info["existing_id"] or str(models.uuid.uuid4()), 
-                "raw_command": raw_cmd,
-                "processed_command": english_processed_command, 
-                "description": english_description, 
-                "tags": [], 
-                "source": f"{shell}_history",
-                "history_timestamp": cmd_info["timestamp"],
-                "added_timestamp": int(time.time()), #
-                "which_info": command_context_data["which_info"],
-                "help_info": command_context_data["help_info"], 
-                "man_info": command_context_data["man_info"]
+    with database.session() as db_conn:
+        # One query resolves every existing raw command and its id; both the
+        # force-reparse classification and the new-command check reuse it.
+        db_raw_command_ids: Dict[str, str] = database.get_raw_command_id_map(conn=db_conn)
+        typer.echo(f"Database already contains {len(db_raw_command_ids)} raw commands.")
+
+        # Dedupe, filter and classify in one fused pass; only the final list is
+        # materialized (the progress bar needs a length).
+        commands_to_process_final: List[Dict[str, Any]] = list(_iter_commands_to_process(
+            raw_history_entries,
+            db_raw_command_ids,
+            force_reparse=force_reparse_all,
+            exclude_help_like=True
+        ))
+
+        if not commands_to_process_final:
+            typer.secho("🤷 No new commands or commands requiring forced update to process.", fg=typer.colors.YELLOW)
+            return
+
+        mode_label = "add or refresh" if force_reparse_all else "new"
+        typer.echo(f"Ready to process commands ({mode_label}): {len(commands_to_process_final)}")
+        if not yes and not typer.confirm(f"About to process {len(commands_to_process_final)} commands with LLM ({mode_label}). Continue?"):
+            typer.echo("Operation cancelled.")
+            raise typer.Exit()
+
+        processed_count = 0; llm_errors = 0; db_success = 0
+        # Writes are buffered and flushed in bulk so one transaction covers many rows
+        # instead of paying per-row transaction overhead. In force mode the flush
+        # goes through the ON CONFLICT upsert, so SQLite decides add-vs-update per
+        # row and no operation classification is needed on this side.
+        write_buffer: List[models.CommandEntry] = []
+        flush_fn = database.upsert_commands_bulk if force_reparse_all else database.add_commands_bulk
+
+        def _flush_db_buffers():
+            nonlocal db_success
+            if write_buffer:
+                db_success += flush_fn(write_buffer, conn=db_conn)
+                write_buffer.clear()
+
+        # Hoist dotted lookups used on every completion into locals (LOAD_FAST
+        # instead of repeated module-attribute probes in the hot loop).
+        secho = typer.secho
+        yellow = typer.colors.YELLOW
+        command_entry_cls = models.CommandEntry
+        source_name = f"{shell}_history"
+
+        # One urandom read covers every new id: 128 random bits each, rendered
+        # as 32-char hex (collision odds negligible), instead of a uuid4()
+        # syscall + hyphenated formatting per entry. Upserted rows that already
+        # exist keep their stored id (ON CONFLICT never touches the id column),
+        # so generating a fresh id for every entry is safe.
+        id_pool = os.urandom(16 * len(commands_to_process_final))
+        id_iter = (id_pool[i:i + 16].hex() for i in range(0, len(id_pool), 16))
+
+        # LLM calls are network-bound: keep up to LLM_MAX_CONCURRENT_REQUESTS in flight
+        # and drain completions as they arrive. DB writes stay on the main thread.
+        with concurrent.futures.ThreadPoolExecutor(max_workers=config.LLM_MAX_CONCURRENT_REQUESTS) as executor:
+            future_to_cmd_info = {
+                executor.submit(_enrich_command_with_llm, cmd_info["raw_command"]): cmd_info
+                for cmd_info in commands_to_process_final
             }
-            command_to_store = models.CommandEntry(**entry_data)
-
-            if cmd_info["operation"] == "ADD":
-                added_id = database.add_command(command_to_store)
-                if added_id: db_success_add += 1
-                else: typer.secho(f"  Failed to store in database (ADD): {raw_cmd[:30]}...", fg=typer.colors.RED)
-            elif cmd_info["operation"] == "UPDATE":
-                success = database.update_command(command_to_store.id, command_to_store)
-                if success: db_success_update += 1
-                else: typer.secho(f"  Failed to update database (UPDATE): {raw_cmd[:30]}...", fg=typer.colors.RED)
-            
-            processed_count +=1
-
-    typer.echo("\n--- Initialization/Update Summary ---")
-    typer.secho(f"Total commands analyzed: {len(filtered_history_commands)}", fg=typer.colors.BLUE)
-    typer.secho(f"Planned to process (add or update): {len(commands_to_process_final)}", fg=typer.colors.BLUE)
-    typer.secho(f"Actually processed by LLM and attempted to store: {processed_count}", fg=typer.colors.BLUE)
-    if llm_errors > 0: typer.secho(f"LLM processing failed (e.g. couldn't generate description): {llm_errors}", fg=typer.colors.YELLOW)
-    typer.secho(f"Successfully added to database: {db_success_add}", fg=typer.colors.GREEN)
-    typer.secho(f"Successfully updated in database: {db_success_update}", fg=typer.colors.GREEN)
-    # Other failures = total attempts - added - updated - LLM errors (may include database errors)
-    other_failures = processed_count - db_success_add - db_success_update
-    if other_failures > 0:
-         typer.secho(f"Failed for other reasons (e.g. database errors or empty LLM response): {other_failures}", fg=typer.colors.YELLOW)
+            # Completions arrive in bursts from the thread pool; rich coalesces
+            # renders at 4Hz instead of redrawing per iteration.
+            with _make_progress() as progress:
+                task_id = progress.add_task("Processing commands...", total=len(commands_to_process_final))
+                for future in concurrent.futures.as_completed(future_to_cmd_info):
+                    cmd_info = future_to_cmd_info[future]
+                    raw_cmd = cmd_info["raw_command"]
+                    progress.advance(task_id)
+
+                    english_description, english_processed_command, command_context_data = future.result()
+                    if not english_description:
+                        secho(f"  Can't generate English description for '{raw_cmd[:30]}...', skipping.", fg=yellow)
+                        llm_errors += 1
+                        continue
+                    # Default None if not generated
+                    if not english_processed_command:
+                         secho(f"  Failed to generate English command from description for '{raw_cmd[:30]}...', processed_command will be empty.", fg=yellow)
+
+                    entry_data = {
+                        "id": next(id_iter),
+                        "raw_command": raw_cmd,
+                        "processed_command": english_processed_command,
+                        "description": english_description,
+                        "tags": [],
+                        "source": source_name,
+                        "history_timestamp": cmd_info["timestamp"],
+                        "added_timestamp": int(time.time()), #
+                        "which_info": command_context_data["which_info"],
+                        "help_info": command_context_data["help_info"],
+                        "man_info": command_context_data["man_info"]
+                    }
+                    command_to_store = command_entry_cls(**entry_data)
+
+                    write_buffer.append(command_to_store)
+                    if len(write_buffer) >= config.DB_WRITE_BATCH_SIZE:
+                        _flush_db_buffers()
+
+                    processed_count +=1
+
+        _flush_db_buffers()
+
+        typer.echo("\n--- Initialization/Update Summary ---")
+        typer.secho(f"History entries analyzed: {len(raw_history_entries)}", fg=typer.colors.BLUE)
+        typer.secho(f"Planned to process (add or update): {len(commands_to_process_final)}", fg=typer.colors.BLUE)
+        typer.secho(f"Actually processed by LLM and attempted to store: {processed_count}", fg=typer.colors.BLUE)
+        if llm_errors > 0: typer.secho(f"LLM processing failed (e.g. couldn't generate description): {llm_errors}", fg=typer.colors.YELLOW)
+        typer.secho(f"Successfully written to database (added or refreshed): {db_success}", fg=typer.colors.GREEN)
+        # Other failures = total attempts - written - LLM errors (may include database errors)
+        other_failures = processed_count - db_success
+        if other_failures > 0:
+             typer.secho(f"Failed for other reasons (e.g. database errors or empty LLM response): {other_failures}", fg=typer.colors.YELLOW)
 
 
 @app.command(name="sync", help="Sync recent shell history to database (English preferred).")
@@ -210,74 +349,67 @@ def sync_command(
         typer.secho("🤷 Failed to load any commands from history.", fg=typer.colors.YELLOW)
         return
 
-    unique_history_commands_map: Dict[str, history_parser.HistoryEntry] = {}
-    for entry in reversed(raw_history_entries): # Keep the newest timestamp
-        raw_cmd_text = entry.get("command", "").strip()
-        if raw_cmd_text:
-             if raw_cmd_text not in unique_history_commands_map or \
-               (entry.get("timestamp") and (unique_history_commands_map[raw_cmd_text].get("timestamp") is None or \
-                entry.get("timestamp", 0) > unique_history_commands_map[raw_cmd_text].get("timestamp", 0))):
-                unique_history_commands_map[raw_cmd_text] = entry
-    
-    candidate_commands_from_history = list(unique_history_commands_map.values())
-    filtered_history_commands: List[history_parser.HistoryEntry] = []
-    for entry in candidate_commands_from_history:
-        cmd_text = entry.get("command", "")
-        first_word = cmd_text.split(" ")[0] if cmd_text else ""
-        if cmd_text and \
-           len(cmd_text) >= config.MIN_COMMAND_LENGTH and \
-           cmd_text not in config.DEFAULT_COMMAND_EXCLUSION_LIST and \
-           first_word not in config.DEFAULT_COMMAND_EXCLUSION_LIST:
-            filtered_history_commands.append(entry)
-
-    if not filtered_history_commands:
-        typer.secho("🤷 No eligible commands in recent history to sync.", fg=typer.colors.YELLOW)
-        return
-        
-    db_raw_commands_set = set(database.get_all_raw_commands())
-    commands_to_add: List[history_parser.HistoryEntry] = []
-    for hist_entry in filtered_history_commands:
-        if hist_entry.get("command", "") not in db_raw_commands_set:
-            commands_to_add.append(hist_entry)
-
-    if not commands_to_add:
-        typer.secho("No new eligible commands to sync.", fg=typer.colors.BLUE)
-        return
-
-    typer.echo(f"Found {len(commands_to_add)} new commands to process and sync.")
-
-    processed_count = 0; llm_errors = 0; db_success_add = 0
-    with typer.progressbar(commands_to_add, label="Syncing commands", length=len(commands_to_add)) as progress:
-        for hist_entry in progress:
-            raw_cmd = hist_entry.get("command", "")
-            typer.echo(f"\nSyncing: {raw_cmd[:70]}...")
-
-            english_description = llm_handler.generate_description(raw_cmd)
-            if not english_description:
-                typer.secho(f"  Failed to generate English description for '{raw_cmd[:30]}...', skipping.", fg=typer.colors.YELLOW)
-                llm_errors += 1
-                continue
-            english_processed_command = llm_handler.generate_command_from_description(english_description)
-
-            entry_data = {
-                "raw_command": raw_cmd,
-                "processed_command": english_processed_command,
-                "description": english_description,
-                "tags": [],
-                "source": f"{shell}_history_sync",
-                "history_timestamp": hist_entry.get("timestamp"),
+    with database.session() as db_conn:
+        # Same fused dedupe -> filter pipeline as init-history
+        # (non-force mode only yields commands not yet in the database).
+        db_raw_command_ids = database.get_raw_command_id_map(conn=db_conn)
+        commands_to_add: List[Dict[str, Any]] = list(_iter_commands_to_process(
+            raw_history_entries,
+            db_raw_command_ids
+        ))
+
+        if not commands_to_add:
+            typer.secho("No new eligible commands to sync.", fg=typer.colors.BLUE)
+            return
+
+        typer.echo(f"Found {len(commands_to_add)} new commands to process and sync.")
+
+        processed_count = 0; llm_errors = 0; db_success_add = 0
+        sync_add_buffer: List[models.CommandEntry] = []
+        secho = typer.secho
+        yellow = typer.colors.YELLOW
+        command_entry_cls = models.CommandEntry
+        source_name = f"{shell}_history_sync"
+        # Same fan-out as init-history: overlap the two LLM round-trips across commands.
+        with concurrent.futures.ThreadPoolExecutor(max_workers=config.LLM_MAX_CONCURRENT_REQUESTS) as executor:
+            future_to_cmd_info = {
+                executor.submit(_enrich_command_with_llm, cmd_info["raw_command"], False): cmd_info
+                for cmd_info in commands_to_add
             }
-            command_to_store = models.CommandEntry(**entry_data)
-            added_id = database.add_command(command_to_store)
-            if added_id: db_success_add += 1
-            else: typer.secho(f"  Failed to sync command to database: {raw_cmd[:30]}...", fg=typer.colors.RED)
-            processed_count += 1
-            # time.sleep(0.05)
-
-    typer.echo("\n--- Sync Summary ---")
-    typer.secho(f"Attempted to process new commands: {len(commands_to_add)}", fg=typer.colors.BLUE)
-    if llm_errors > 0: typer.secho(f"LLM processing failed: {llm_errors}", fg=typer.colors.YELLOW)
-    typer.secho(f"Successfully synced to database: {db_success_add}", fg=typer.colors.GREEN)
+            with _make_progress() as progress:
+                task_id = progress.add_task("Syncing commands", total=len(commands_to_add))
+                for future in concurrent.futures.as_completed(future_to_cmd_info):
+                    cmd_info = future_to_cmd_info[future]
+                    raw_cmd = cmd_info["raw_command"]
+                    progress.advance(task_id)
+
+                    english_description, english_processed_command, _ = future.result()
+                    if not english_description:
+                        secho(f"  Failed to generate English description for '{raw_cmd[:30]}...', skipping.", fg=yellow)
+                        llm_errors += 1
+                        continue
+
+                    entry_data = {
+                        "raw_command": raw_cmd,
+                        "processed_command": english_processed_command,
+                        "description": english_description,
+                        "tags": [],
+                        "source": source_name,
+                        "history_timestamp": cmd_info["timestamp"],
+                    }
+                    command_to_store = command_entry_cls(**entry_data)
+                    sync_add_buffer.append(command_to_store)
+                    if len(sync_add_buffer) >= config.DB_WRITE_BATCH_SIZE:
+                        db_success_add += database.add_commands_bulk(sync_add_buffer, conn=db_conn)
+                        sync_add_buffer.clear()
+                    processed_count += 1
+
+        db_success_add += database.add_commands_bulk(sync_add_buffer, conn=db_conn)
+
+        typer.echo("\n--- Sync Summary ---")
+        typer.secho(f"Attempted to process new commands: {len(commands_to_add)}", fg=typer.colors.BLUE)
+        if llm_errors > 0: typer.secho(f"LLM processing failed: {llm_errors}", fg=typer.colors.YELLOW)
+        typer.secho(f"Successfully synced to database: {db_success_add}", fg=typer.colors.GREEN)
 
 
 @app.command(name="search", help="Search commands by natural language description (English preferred).")
@@ -304,30 +436,35 @@ def search_command(
                 apply_prefix_to_all_terms=True
             )
         else:
-            query_terms = current_fzf_query.split()
-            if query_terms and len(query_terms[-1]) >= 1: 
-                query_terms[-1] = query_terms[-1] + "*"
-                current_fzf_query = " ".join(query_terms)
+            # Append the prefix star with one slice-free concat instead of
+            # split / mutate / join (three allocations per keystroke).
+            stripped_query = current_fzf_query.strip()
+            if stripped_query and not stripped_query.endswith("*"):
+                current_fzf_query = stripped_query + "*"
                 # For simplicity, users can type `*` in fzf input if they want wildcards
 
-        fts_results = database.search_commands_fts(current_fzf_query, top_k=config.BM25_TOP_K) 
-        
-        db_results: List[models.CommandEntry] = []
-        for cmd_id, _ in fts_results:
-            entry = database.get_command_by_id(cmd_id)
-            if entry:
-                db_results.append(entry)
-        
-        # Here output is accepted by fzf (printing to stdout)
+        # One joined statement hydrates entries straight from the FTS hits —
+        # no second IN (...) round-trip on every keystroke.
+        db_results: List[models.CommandEntry] = database.search_commands(
+            current_fzf_query, top_k=config.BM25_TOP_K
+        )
+
+        # Here output is accepted by fzf: escape each line, then emit the whole
+        # batch with one buffered binary write instead of a print per entry —
+        # this branch runs on every fzf keystroke.
+        output_parts = []
         for entry in db_results:
             tags_str = ", ".join(entry.tags) if entry.tags else ""
             # Here, the "`" character will run directly, so we must replace it with "\\`"
             safe_output = f"{entry.raw_command}\x1F{entry.description or ''}\x1F{entry.processed_command or entry.raw_command}\x1F[{tags_str}]"
-            safe_output = safe_output.replace("`", "\"") 
-            # safe_output = safe_output.replace("~", "\\~") 
+            safe_output = safe_output.replace("`", "\"")
+            # safe_output = safe_output.replace("~", "\\~")
             safe_output = safe_output.replace("\n", "\\n") # fzf may handle newlines, so we escape them with \n
-            print(safe_output) # fzf may handle newlines, so we escape them with \n
-        raise typer.Exit(0) 
+            output_parts.append(safe_output)
+        if output_parts:
+            sys.stdout.buffer.write(("\n".join(output_parts) + "\n").encode('utf-8'))
+            sys.stdout.buffer.flush()
+        raise typer.Exit(0)
 
     # --- Mode 2: Formal search --- ()
     # TODO: Not implemented yet, something is not useful (e.g. translate, llm enhanced query -- because it's slow)
@@ -348,35 +485,33 @@ def search_command(
             apply_prefix_to_all_terms=True
         )
     else:
-        query_terms = english_query_for_search.split()
-        if query_terms and len(query_terms[-1]) >= 1: 
-            query_terms[-1] = query_terms[-1] + "*"
-            english_query_for_search = " ".join(query_terms)
+        stripped_query = english_query_for_search.strip()
+        if stripped_query and not stripped_query.endswith("*"):
+            english_query_for_search = stripped_query + "*"
             # For simplicity, users can type `*` in fzf input if they want wildcards
 
     typer.echo(f"🔍 Searching for: \"{english_query_for_search}\"")
     if not raw_output: typer.echo(f"⚡️ Executing sparse search (FTS5) with query: \"{english_query_for_search}\"")
-    fts_results_with_scores = database.search_commands_fts(english_query_for_search, top_k=top_k)
-
-    if not fts_results_with_scores:
-        if not raw_output: typer.secho("🤷 (FTS5) No commands matching your query were found.", fg=typer.colors.YELLOW)
-        raise typer.Exit(code=1)
+    results: List[models.CommandEntry] = database.search_commands(english_query_for_search, top_k=top_k)
 
-    results: List[models.CommandEntry] = []
-    for cmd_id, score in fts_results_with_scores:
-        entry = database.get_command_by_id(cmd_id)
-        if entry:
-            results.append(entry)
-    
     if not results:
-        if not raw_output: typer.secho("🤷 FTS found matches but couldn't retrieve command details.", fg=typer.colors.RED)
+        if not raw_output: typer.secho("🤷 (FTS5) No commands matching your query were found.", fg=typer.colors.YELLOW)
         raise typer.Exit(code=1)
 
     if not raw_output: typer.echo(f"✅ (FTS5) Found {len(results)} potentially relevant commands, displaying via fzf...")
-    
-    elif raw_output: 
+
+    selected_entry = _display_results_with_fzf(results)
+    if selected_entry is None:
+        if not raw_output: typer.secho("No command selected.", fg=typer.colors.YELLOW)
         raise typer.Exit(code=1)
 
+    if raw_output:
+        print(selected_entry.raw_command)
+    else:
+        typer.secho(f"Selected command: {selected_entry.raw_command}", fg=typer.colors.GREEN)
+        if selected_entry.description:
+            typer.echo(f"Description: {selected_entry.description}")
+
 # ... (Other commands and main_callback, if __name__ == "__main__": app() remain unchanged) ...
 
 
@@ -396,11 +531,10 @@ def add_command_manual(
         typer.echo(f"Fetching context info for '{base_cmd_for_context}'...")
         command_context_data = utils.get_command_context(command)
 
-    english_description = description_input 
-    if description_input and description_input.strip():
-        # Simple check if translation is needed (e.g., contains Chinese characters)
-            # More complex language detection like langdetect could be used but adds dependencies
-        # Here we assume if user input is Chinese, translate it; if English, translation has minimal impact
+    english_description = description_input
+    if description_input and description_input.strip() and _CJK_RE.search(description_input):
+        # Simple check if translation is needed (contains CJK characters);
+        # pure-ASCII/English input skips the LLM round-trip entirely.
         # Alternatively could add a --lang option for user to specify input language
         translated_desc = llm_handler.translate_text(description_input, target_language="English")
         if translated_desc:
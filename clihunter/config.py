@@ -4,10 +4,10 @@ from pathlib import Path
 from dotenv import load_dotenv
 from typing import Optional, List
 
-# Load environment variables from .env file if it exists
-# Useful for local development to store API keys etc.
-dotenv_path = Path('.') / '.env'
-load_dotenv(dotenv_path=dotenv_path)
+# .env loading is deferred to _ensure_dotenv_loaded(), which runs on the
+# first access to an env-derived setting (see __getattr__ below). Commands
+# that never read one — `--help`, `list` — skip opening and parsing both
+# .env files entirely.
 
 # XDG Base Directory Specification
 XDG_CONFIG_HOME = Path(os.environ.get('XDG_CONFIG_HOME', Path.home() / '.config'))
@@ -21,47 +21,81 @@ APP_STATE_DIR = XDG_STATE_HOME / APP_NAME # For future logs or cache
 USER_ENV_FILE_PATH = APP_CONFIG_DIR / "clihunter.env" # 或 "user.env"
 
 
-# Ensure directories exist
-APP_CONFIG_DIR.mkdir(parents=True, exist_ok=True)
-APP_DATA_DIR.mkdir(parents=True, exist_ok=True)
-APP_STATE_DIR.mkdir(parents=True, exist_ok=True)
+# Ensure directories exist. After the first run they always do, so probe
+# with one stat (usually served from the dentry cache) instead of issuing
+# an unconditional mkdir that fails with EEXIST on every import.
+for _app_dir in (APP_CONFIG_DIR, APP_DATA_DIR, APP_STATE_DIR):
+    if not _app_dir.is_dir():
+        _app_dir.mkdir(parents=True, exist_ok=True)
+del _app_dir
 
 user_config_loaded = False
-if USER_ENV_FILE_PATH.is_file():
+_dotenv_loaded = False
+
+def _ensure_dotenv_loaded() -> None:
+    """
+    Load the working-directory .env (useful for local development to store
+    API keys etc.) and the user's clihunter.env, exactly once per process.
+    Called from the lazy settings accessor, so the files are only opened and
+    parsed when an env-derived setting is actually consumed.
+    """
+    global user_config_loaded, _dotenv_loaded
+    if _dotenv_loaded:
+        return
+    _dotenv_loaded = True
+    # stat before load: most invocations run from directories without a
+    # .env, and load_dotenv would still open the file and run its parser.
     # load_dotenv default override=False
     # This means if the variable is already set in the environment, it won't be overridden by the .env file.
-    if load_dotenv(dotenv_path=USER_ENV_FILE_PATH):
-        user_config_loaded = True
-    else:
-        pass
-else:
-    pass
+    cwd_env_path = Path('.') / '.env'
+    if cwd_env_path.is_file():
+        load_dotenv(dotenv_path=cwd_env_path)
+    if USER_ENV_FILE_PATH.is_file():
+        if load_dotenv(dotenv_path=USER_ENV_FILE_PATH):
+            user_config_loaded = True
 
 # --- Database Configuration ---
 DEFAULT_DB_FILENAME = "commands.db"
 DATABASE_PATH = APP_DATA_DIR / DEFAULT_DB_FILENAME
 
-# --- LLM Configuration ---
-# For OpenAI, Anthropic, Google Gemini, or other cloud LLMs
-LLM_API_KEY: Optional[str] = os.environ.get("CLIHUNTER_LLM_API_KEY") # e.g., sk-xxxx
-LLM_API_BASE_URL: Optional[str] = os.environ.get("CLIHUNTER_LLM_API_BASE_URL") # For self-hosted or proxy
-LLM_MODEL_NAME: str = os.environ.get("CLIHUNTER_LLM_MODEL_NAME", "gpt-3.5-turbo") # Default model
-
-# For local Ollama
-OLLAMA_BASE_URL: str = os.environ.get("CLIHUNTER_OLLAMA_BASE_URL", "http://localhost:11434")
-OLLAMA_MODEL_NAME: str = os.environ.get("CLIHUNTER_OLLAMA_LLM_MODEL_NAME", "llama3:8b-instruct-q5_K_M") # A reasonable default
-OLLAMA_EMBEDDING_MODEL_NAME: str = os.environ.get("CLIHUNTER_OLLAMA_EMBEDDING_MODEL_NAME", "mxbai-embed-large") # For Ollama embeddings
-
-# Determine which LLM provider to use (simple logic, can be expanded)
-LLM_PROVIDER: str = os.environ.get("CLIHUNTER_LLM_PROVIDER", "openai").lower() # "openai", "ollama", etc.
-
-# --- Embedding Model Configuration ---
-# If not using Ollama for embeddings, specify a sentence-transformer model
-SENTENCE_TRANSFORMER_MODEL: str = os.environ.get(
-    "CLIHUNTER_SENTENCE_TRANSFORMER_MODEL",
-    "shibing624/text2vec-base-chinese" # Example for Chinese, or use a multilingual one
-    # "all-MiniLM-L6-v2" # A good multilingual default
-)
+# --- LLM / Embedding / FZF Configuration (lazy) ---
+# Env-derived settings are resolved on first attribute access via the module
+# __getattr__ below, then cached in globals() so later reads are plain module
+# attribute lookups. Commands that never touch the LLM don't pay for the env
+# reads at import time.
+_ENV_SETTINGS = {
+    # For OpenAI, Anthropic, Google Gemini, or other cloud LLMs
+    "LLM_API_KEY": lambda: os.environ.get("CLIHUNTER_LLM_API_KEY"),  # e.g., sk-xxxx
+    "LLM_API_BASE_URL": lambda: os.environ.get("CLIHUNTER_LLM_API_BASE_URL"),  # For self-hosted or proxy
+    "LLM_MODEL_NAME": lambda: os.environ.get("CLIHUNTER_LLM_MODEL_NAME", "gpt-3.5-turbo"),  # Default model
+    # For local Ollama
+    "OLLAMA_BASE_URL": lambda: os.environ.get("CLIHUNTER_OLLAMA_BASE_URL", "http://localhost:11434"),
+    "OLLAMA_MODEL_NAME": lambda: os.environ.get("CLIHUNTER_OLLAMA_LLM_MODEL_NAME", "llama3:8b-instruct-q5_K_M"),
+    "OLLAMA_EMBEDDING_MODEL_NAME": lambda: os.environ.get("CLIHUNTER_OLLAMA_EMBEDDING_MODEL_NAME", "mxbai-embed-large"),
+    # Which LLM provider to use (simple logic, can be expanded)
+    "LLM_PROVIDER": lambda: os.environ.get("CLIHUNTER_LLM_PROVIDER", "openai").lower(),
+    # Max number of LLM requests kept in flight at once (init-history / sync are network-bound)
+    "LLM_MAX_CONCURRENT_REQUESTS": lambda: int(os.environ.get("CLIHUNTER_LLM_MAX_CONCURRENT_REQUESTS", "8")),
+    # How many processed entries to buffer before flushing to SQLite in one transaction
+    "DB_WRITE_BATCH_SIZE": lambda: int(os.environ.get("CLIHUNTER_DB_WRITE_BATCH_SIZE", "100")),
+    # If not using Ollama for embeddings, specify a sentence-transformer model
+    "SENTENCE_TRANSFORMER_MODEL": lambda: os.environ.get(
+        "CLIHUNTER_SENTENCE_TRANSFORMER_MODEL",
+        "shibing624/text2vec-base-chinese"  # Example for Chinese, or use a multilingual one
+        # "all-MiniLM-L6-v2" # A good multilingual default
+    ),
+    "FZF_EXECUTABLE": lambda: os.environ.get("CLIHUNTER_FZF_EXECUTABLE", "fzf"),
+}
+
+def __getattr__(name: str):
+    try:
+        factory = _ENV_SETTINGS[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    _ensure_dotenv_loaded()
+    value = factory()
+    globals()[name] = value  # cache: later reads bypass __getattr__
+    return value
 
 # --- History Parsing Configuration ---
 DEFAULT_SHELL_HISTORY_FILES = {
@@ -74,11 +108,36 @@ DEFAULT_COMMAND_EXCLUSION_LIST: List[str] = [
     "ls", "cd", "pwd", "clear", "exit", "history", "man", "top", "htop", "vim", "vi", "nano", "code",  "source", "echo", "clihunter", "which", "export" 
     # Add more as needed
 ]
+# Frozen once for O(1) membership tests in the history filter loops
+DEFAULT_COMMAND_EXCLUSION_SET: frozenset = frozenset(DEFAULT_COMMAND_EXCLUSION_LIST)
+
+# C-level fast path for the exclusion check: str.startswith with a tuple is a
+# single C call, so "<word> ..." commands are rejected without any Python-level
+# scanning. The trailing space avoids false positives like "lsblk" vs "ls";
+# bare "<word>" with no arguments is covered by the exact-match set above.
+DEFAULT_COMMAND_EXCLUSION_PREFIXES: tuple = tuple(w + " " for w in DEFAULT_COMMAND_EXCLUSION_LIST)
+
+# Prefix trie over the exclusion list (nested dicts, EXCLUSION_TRIE_END marks a
+# complete word). Lets the filter loop test a raw command against every
+# excluded base command in one character-by-character walk, without first
+# splitting out the base command.
+EXCLUSION_TRIE_END = "\0"
+
+def _build_exclusion_trie(words: List[str]) -> dict:
+    root: dict = {}
+    for word in words:
+        node = root
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[EXCLUSION_TRIE_END] = True
+    return root
+
+EXCLUSION_TRIE: dict = _build_exclusion_trie(DEFAULT_COMMAND_EXCLUSION_LIST)
 # Filter commands shorter than this length
 MIN_COMMAND_LENGTH = 5
 
 # --- FZF Configuration ---
-FZF_EXECUTABLE: str = os.environ.get("CLIHUNTER_FZF_EXECUTABLE", "fzf")
+# FZF_EXECUTABLE is resolved lazily via _ENV_SETTINGS above.
 FZF_DEFAULT_OPTIONS: str = (
     "--height 40% --layout=reverse --border "
     "--preview 'echo {} | cut -d \"::\" -f 3- ' " # Show full command in preview
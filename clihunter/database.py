@@ -1,66 +1,303 @@
 # clihunter/database.py
+import atexit
+import logging
 import sqlite3
+import threading
 import time
 import json # Used to store lists (like tags) in TEXT fields
-# import numpy as np 
+# import numpy as np
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Optional, Tuple, Any
+from typing import Dict, List, Optional, Tuple, Any, Iterator
 
 # Import config and data models from our own project
 from . import config # Get DATABASE_PATH and other configurations
 from . import models # Get CommandEntry model
 
+# Library-style logging: debug/error messages cost nothing unless the app
+# configures a handler, and %-formatting defers string building until a
+# record is actually emitted. The old print() calls serialized bulk ingest
+# behind the stdout lock and a write() syscall per row.
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+# One persistent connection per thread: reopening the DB file on every CRUD
+# call costs an open/close syscall pair and re-initialization of the FTS5
+# module each time, which dominates small point lookups.
+_thread_local = threading.local()
+
 def get_db_connection() -> sqlite3.Connection:
     """
-    Create and return a connection to SQLite database.
-    Database path is obtained from config.py.
+    Return this thread's persistent connection to the SQLite database,
+    creating it on first use. Database path is obtained from config.py;
+    if the path changes (e.g. tests swapping config.DATABASE_PATH), the
+    cached connection is replaced. Connections are closed at interpreter
+    exit — callers use `with conn:` only for transaction scope.
     """
-    conn = sqlite3.connect(str(config.DATABASE_PATH))
+    db_path = str(config.DATABASE_PATH)
+    conn = getattr(_thread_local, "conn", None)
+    if conn is not None and getattr(_thread_local, "conn_path", None) == db_path:
+        return conn
+    if conn is not None:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+    conn = sqlite3.connect(db_path, check_same_thread=False, cached_statements=256)
     conn.row_factory = sqlite3.Row # Access data by column name
+    # Tune once per connection: WAL turns commits into sequential log appends
+    # (one fsync instead of a journal rewrite per transaction), NORMAL sync is
+    # safe under WAL, and the cache/mmap settings keep hot pages out of the
+    # read() path. WAL is file-compatible, so no migration is needed.
+    conn.executescript("""
+        PRAGMA journal_mode=WAL;
+        PRAGMA synchronous=NORMAL;
+        PRAGMA temp_store=MEMORY;
+        PRAGMA cache_size=-65536;
+        PRAGMA mmap_size=268435456;
+        PRAGMA foreign_keys=ON;
+    """)
+    _thread_local.conn = conn
+    _thread_local.conn_path = db_path
+    atexit.register(conn.close)
     return conn
 
+@contextmanager
+def session() -> Iterator[sqlite3.Connection]:
+    """
+    Yield one connection for a whole command scope. Functions that accept an
+    optional conn can share it instead of resolving it per statement.
+    The underlying connection is cached per thread, so it stays open for
+    later calls after the scope exits.
+    """
+    yield get_db_connection()
+
+# --- SQL statements ---
+# Hoisted to module constants so every call passes the identical string:
+# sqlite3's per-connection statement cache (sized via cached_statements
+# above) then prepares each of them exactly once per process, and the
+# f-string queries are not rebuilt per call.
+
+# Hydrates the tag list as a single CHAR(31)-joined string per command, so
+# reads pay one split() instead of a JSON parse. Queries selecting from
+# `saved_commands sc` append this as their `tags` column.
+_TAGS_SUBSELECT = (
+    "(SELECT GROUP_CONCAT(tag, CHAR(31)) FROM command_tags ct WHERE ct.command_id = sc.id)"
+)
+
+_SQL_INSERT_COMMAND = """
+    INSERT INTO saved_commands
+    (id, raw_command, processed_command, description, source, history_timestamp, added_timestamp, which_info, help_info, man_info, search_text)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(raw_command) DO NOTHING
+    RETURNING id
+"""
+
+_SQL_INSERT_COMMANDS_BULK = """
+    INSERT OR IGNORE INTO saved_commands
+    (id, raw_command, processed_command, description, source, history_timestamp, added_timestamp, which_info, help_info, man_info, search_text)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+_SQL_UPSERT_COMMANDS_BULK = """
+    INSERT INTO saved_commands
+    (id, raw_command, processed_command, description, source, history_timestamp, added_timestamp, which_info, help_info, man_info, search_text)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(raw_command) DO UPDATE SET
+        processed_command = excluded.processed_command,
+        description = excluded.description,
+        source = excluded.source,
+        history_timestamp = excluded.history_timestamp,
+        which_info = excluded.which_info,
+        help_info = excluded.help_info,
+        man_info = excluded.man_info,
+        search_text = excluded.search_text
+"""
+
+_SQL_UPDATE_COMMAND = """
+    UPDATE saved_commands SET
+        raw_command = ?,
+        processed_command = ?,
+        description = ?,
+        source = ?,
+        history_timestamp = ? ,
+        which_info = ?,
+        help_info = ?,
+        man_info = ?,
+        search_text = ?
+    WHERE id = ?
+"""
+
+_SQL_INSERT_TAG = "INSERT OR IGNORE INTO command_tags (command_id, tag) VALUES (?, ?)"
+_SQL_DELETE_TAGS_FOR_COMMAND = "DELETE FROM command_tags WHERE command_id = ?"
+
+_SQL_SELECT_BY_ID = (
+    f"SELECT sc.*, {_TAGS_SUBSELECT} AS tags FROM saved_commands sc WHERE sc.id = ?"
+)
+_SQL_SELECT_BY_RAW_COMMAND = (
+    f"SELECT sc.*, {_TAGS_SUBSELECT} AS tags FROM saved_commands sc WHERE sc.raw_command = ?"
+)
+_SQL_SELECT_ALL = (
+    f"SELECT sc.*, {_TAGS_SUBSELECT} AS tags FROM saved_commands sc ORDER BY sc.added_timestamp DESC"
+)
+
+_SQL_SEARCH_FTS = """
+    SELECT sc.id AS command_id, commands_fts.rank
+    FROM commands_fts
+    JOIN saved_commands sc ON sc.rowid = commands_fts.rowid
+    WHERE commands_fts MATCH ?
+    ORDER BY bm25(commands_fts)
+    LIMIT ?
+"""
+
+_SQL_SEARCH_HYDRATED = f"""
+    SELECT sc.*, {_TAGS_SUBSELECT} AS tags
+    FROM commands_fts
+    JOIN saved_commands sc ON sc.rowid = commands_fts.rowid
+    WHERE commands_fts MATCH ?
+    ORDER BY bm25(commands_fts)
+    LIMIT ?
+"""
+
+
 def create_tables(conn: Optional[sqlite3.Connection] = None) -> None:
     """
     Create required tables in database if they don't exist.
     MVP version: Removed embedding column from saved_commands table.
     """
-    close_conn_here = False
     if conn is None:
         conn = get_db_connection()
-        close_conn_here = True
 
     cursor = conn.cursor()
 
     # saved_commands table: stores core command information
-    # Removed embedding BLOB column
+    # Removed embedding BLOB column. search_text holds the precomputed
+    # searchable text so the FTS index can read it as external content;
+    # tags live in the normalized command_tags table below.
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS saved_commands (
         id TEXT PRIMARY KEY,
         raw_command TEXT NOT NULL UNIQUE,
         processed_command TEXT,
         description TEXT,
-        tags TEXT, 
         source TEXT,
         history_timestamp INTEGER,
         added_timestamp INTEGER DEFAULT (STRFTIME('%s', 'now')),
         which_info TEXT,
         help_info TEXT,
-        man_info TEXT
+        man_info TEXT,
+        search_text TEXT
     )
     """)
 
+    # One row per (command, tag): no json.dumps/loads per command on the
+    # read and write paths, and tag filters become indexable.
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS command_tags (
+        command_id TEXT NOT NULL REFERENCES saved_commands(id) ON DELETE CASCADE,
+        tag TEXT NOT NULL,
+        PRIMARY KEY (command_id, tag)
+    ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_command_tags_tag ON command_tags(tag)")
+
+    # Migration from the pre-search_text schema: add the column, then
+    # backfill it so the rebuilt FTS index below has content to read.
+    cursor.execute("PRAGMA table_info(saved_commands)")
+    existing_columns = {row[1] for row in cursor.fetchall()}
+    if "search_text" not in existing_columns:
+        cursor.execute("ALTER TABLE saved_commands ADD COLUMN search_text TEXT")
+
+    # Migration from the JSON tags column: explode it into command_tags,
+    # then drop the column (SQLite >= 3.35).
+    if "tags" in existing_columns:
+        tag_rows = []
+        for row in cursor.execute(
+            "SELECT id, tags FROM saved_commands WHERE tags IS NOT NULL AND tags NOT IN ('', '[]')"
+        ).fetchall():
+            try:
+                tags = json.loads(row['tags'])
+            except (ValueError, TypeError):
+                continue
+            tag_rows.extend((row['id'], tag) for tag in tags if tag)
+        cursor.executemany(
+            "INSERT OR IGNORE INTO command_tags (command_id, tag) VALUES (?, ?)", tag_rows
+        )
+        cursor.execute("ALTER TABLE saved_commands DROP COLUMN tags")
+
+    # The FTS table is external-content: it indexes saved_commands.search_text
+    # without storing a second copy of the text, halving write volume and WAL
+    # churn on the write path. A table built on an older schema (contentful,
+    # or with the porter tokenizer) is dropped and rebuilt once.
+    fts_sql_row = cursor.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'commands_fts'"
+    ).fetchone()
+    # sqlite_master stores the CREATE statement verbatim, whitespace and
+    # case included, so collapse both before probing for options — the
+    # statement below spells the option as "content = '...'".
+    fts_sql = (fts_sql_row[0] or "") if fts_sql_row else ""
+    fts_options = "".join(fts_sql.lower().split())
+    legacy_fts = fts_sql_row is not None and (
+        "content=" not in fts_options or "trigram" not in fts_options
+    )
+    if legacy_fts:
+        cursor.execute("DROP TABLE commands_fts")
+
+    rows_to_backfill = cursor.execute(
+        f"SELECT sc.*, {_TAGS_SUBSELECT} AS tags FROM saved_commands sc WHERE sc.search_text IS NULL"
+    ).fetchall()
+    if rows_to_backfill:
+        backfill = []
+        for row in rows_to_backfill:
+            entry = _row_to_command_entry(row)
+            if entry:
+                backfill.append((entry.get_searchable_text(), entry.id))
+        cursor.executemany(
+            "UPDATE saved_commands SET search_text = ? WHERE id = ?", backfill
+        )
+
+    # trigram (SQLite >= 3.34) instead of 'porter unicode61': the porter
+    # stemmer mangles CLI tokens like --exclude-dir or node_modules and
+    # blocks substring matches, while trigram matches any >=3-char fragment
+    # and skips the per-token stemming work on every insert.
     cursor.execute("""
     CREATE VIRTUAL TABLE IF NOT EXISTS commands_fts USING fts5(
-        command_id UNINDEXED,       -- saved_commands.id
         search_text,
-        tokenize = 'porter unicode61' 
+        content = 'saved_commands',
+        content_rowid = 'rowid',
+        tokenize = 'trigram'
     )
     """)
-    
+    if legacy_fts:
+        cursor.execute("INSERT INTO commands_fts(commands_fts) VALUES('rebuild')")
+
+    # get_all_commands orders by added_timestamp DESC; without this index
+    # SQLite sorts the whole table in a temp B-tree on every call. The
+    # source index serves per-shell filtering.
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_saved_commands_added_ts ON saved_commands(added_timestamp DESC)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_saved_commands_source ON saved_commands(source)"
+    )
+
+    # Triggers keep the FTS index in sync, so the CRUD functions never have
+    # to touch commands_fts themselves.
+    cursor.executescript("""
+        CREATE TRIGGER IF NOT EXISTS saved_commands_ai AFTER INSERT ON saved_commands BEGIN
+            INSERT INTO commands_fts(rowid, search_text) VALUES (new.rowid, new.search_text);
+        END;
+        CREATE TRIGGER IF NOT EXISTS saved_commands_ad AFTER DELETE ON saved_commands BEGIN
+            INSERT INTO commands_fts(commands_fts, rowid, search_text) VALUES('delete', old.rowid, old.search_text);
+        END;
+        CREATE TRIGGER IF NOT EXISTS saved_commands_au AFTER UPDATE ON saved_commands BEGIN
+            INSERT INTO commands_fts(commands_fts, rowid, search_text) VALUES('delete', old.rowid, old.search_text);
+            INSERT INTO commands_fts(rowid, search_text) VALUES (new.rowid, new.search_text);
+        END;
+    """)
+
     conn.commit()
-    if close_conn_here:
-        conn.close()
-    print("Database tables created successfully or already exist (MVP schema).")
+    logger.debug("Database tables created successfully or already exist (MVP schema).")
 
 
 # --- CRUD ---
@@ -69,51 +306,210 @@ def add_command(entry: models.CommandEntry) -> Optional[str]:
     """
     Add a new command record to database (MVP version, no embedding).
     If raw_command already exists, insertion will be ignored due to UNIQUE constraint.
-    On successful insertion, related text is also added to FTS5 table for searching.
+    The FTS index follows automatically via the saved_commands triggers.
     """
-    # list in Pydantic model (like tags) needs to be serialized to JSON string
-    tags_json = json.dumps(entry.tags or []) 
-
     try:
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            
-            sql = """
-                INSERT OR IGNORE INTO saved_commands 
-                (id, raw_command, processed_command, description, tags, source, history_timestamp, added_timestamp, which_info, help_info, man_info)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """
+
+            # RETURNING (SQLite >= 3.35) answers "did this row land, and with
+            # which id" in the same statement — no rowcount check and no
+            # follow-up get_command_by_raw_command for the caller.
             params = (
-                entry.id, 
-                entry.raw_command, 
+                entry.id,
+                entry.raw_command,
                 entry.processed_command,
                 entry.description,
-                tags_json,
                 entry.source,
                 entry.history_timestamp,
                 entry.added_timestamp,
                 entry.which_info,
                 entry.help_info,
-                entry.man_info
+                entry.man_info,
+                entry.get_searchable_text()
             )
-            cursor.execute(sql, params)
-
-            if cursor.rowcount == 0:
+            cursor.execute(_SQL_INSERT_COMMAND, params)
+            row = cursor.fetchone()
+            if row is None:
                 return None
+            if entry.tags:
+                cursor.executemany(_SQL_INSERT_TAG, [(entry.id, tag) for tag in entry.tags])
+            return row['id']
 
-            command_id = entry.id
-
-            searchable_text = entry.get_searchable_text() 
-            cursor.execute(
-                "INSERT INTO commands_fts (command_id, search_text) VALUES (?, ?)",
-                (command_id, searchable_text)
-            )
-            return command_id
-            
     except sqlite3.Error as e:
-        print(f"Database error occurred when adding command: {e}")
+        logger.error("Database error occurred when adding command: %s", e)
         return None
     
+def add_commands_bulk(entries: List[models.CommandEntry], conn: Optional[sqlite3.Connection] = None) -> int:
+    """
+    Add many command records in one transaction via executemany.
+    Duplicated raw_commands are ignored (same UNIQUE constraint as add_command);
+    the FTS index follows automatically via the saved_commands triggers.
+    A shared connection (see session()) can be passed for transaction scoping.
+    Returns the number of newly inserted commands.
+    """
+    if not entries:
+        return 0
+    rows = [
+        (
+            e.id,
+            e.raw_command,
+            e.processed_command,
+            e.description,
+            e.source,
+            e.history_timestamp,
+            e.added_timestamp,
+            e.which_info,
+            e.help_info,
+            e.man_info,
+            e.get_searchable_text()
+        )
+        for e in entries
+    ]
+    try:
+        if conn is None:
+            conn = get_db_connection()
+        with conn:
+            cursor = conn.cursor()
+            cursor.executemany(_SQL_INSERT_COMMANDS_BULK, rows)
+            # executemany accumulates rowcount, so this is the number of rows
+            # that survived INSERT OR IGNORE.
+            inserted = cursor.rowcount
+            # Tag rows may only reference ids that actually landed (duplicates
+            # kept their existing row/id), so resolve those first. The check
+            # only runs when some entry carries tags — history ingestion never
+            # does, so the common path stays a single statement.
+            tag_entries = [e for e in entries if e.tags]
+            if tag_entries:
+                candidate_ids = [e.id for e in tag_entries]
+                placeholders = ", ".join("?" * len(candidate_ids))
+                cursor.execute(
+                    f"SELECT id FROM saved_commands WHERE id IN ({placeholders})",
+                    candidate_ids
+                )
+                landed_ids = {row['id'] for row in cursor.fetchall()}
+                cursor.executemany(
+                    _SQL_INSERT_TAG,
+                    [
+                        (e.id, tag)
+                        for e in tag_entries if e.id in landed_ids
+                        for tag in e.tags
+                    ]
+                )
+            return inserted
+    except sqlite3.Error as e:
+        logger.error("Database error occurred when bulk-adding commands: %s", e)
+        return 0
+
+
+def upsert_commands_bulk(entries: List[models.CommandEntry], conn: Optional[sqlite3.Connection] = None) -> int:
+    """
+    Insert-or-update many command records in one transaction using
+    INSERT ... ON CONFLICT(raw_command) DO UPDATE. SQLite picks the right
+    path per row, so callers don't need to classify ADD vs UPDATE upfront;
+    an existing row keeps its original id. The FTS index follows
+    automatically via the saved_commands triggers. Returns the number of
+    entries.
+    """
+    if not entries:
+        return 0
+    rows = [
+        (
+            e.id,
+            e.raw_command,
+            e.processed_command,
+            e.description,
+            e.source,
+            e.history_timestamp,
+            e.added_timestamp,
+            e.which_info,
+            e.help_info,
+            e.man_info,
+            e.get_searchable_text()
+        )
+        for e in entries
+    ]
+    try:
+        if conn is None:
+            conn = get_db_connection()
+        with conn:
+            cursor = conn.cursor()
+            cursor.executemany(_SQL_UPSERT_COMMANDS_BULK, rows)
+
+            # Tags must attach to the stored id, which differs from e.id when
+            # the row already existed. The id resolution only runs when some
+            # entry actually carries tags (history ingestion never does).
+            tag_entries = [e for e in entries if e.tags]
+            if tag_entries:
+                raw_commands = [e.raw_command for e in tag_entries]
+                placeholders = ", ".join("?" * len(raw_commands))
+                cursor.execute(
+                    f"SELECT id, raw_command FROM saved_commands WHERE raw_command IN ({placeholders})",
+                    raw_commands
+                )
+                id_by_raw = {row['raw_command']: row['id'] for row in cursor.fetchall()}
+                cursor.executemany(
+                    _SQL_DELETE_TAGS_FOR_COMMAND,
+                    [(cid,) for cid in id_by_raw.values()]
+                )
+                cursor.executemany(
+                    _SQL_INSERT_TAG,
+                    [
+                        (id_by_raw[e.raw_command], tag)
+                        for e in tag_entries if e.raw_command in id_by_raw
+                        for tag in e.tags
+                    ]
+                )
+            return len(entries)
+    except sqlite3.Error as e:
+        logger.error("Database error occurred when bulk-upserting commands: %s", e)
+        return 0
+
+
+def update_commands_bulk(entries: List[models.CommandEntry], conn: Optional[sqlite3.Connection] = None) -> int:
+    """
+    Update many command records (matched by id) in one transaction.
+    The FTS index follows automatically via the saved_commands triggers.
+    A shared connection (see session()) can be passed for transaction scoping.
+    Returns the number of entries processed.
+    """
+    if not entries:
+        return 0
+    rows = [
+        (
+            e.raw_command,
+            e.processed_command,
+            e.description,
+            e.source,
+            e.history_timestamp,
+            e.which_info,
+            e.help_info,
+            e.man_info,
+            e.get_searchable_text(),
+            e.id
+        )
+        for e in entries
+    ]
+    try:
+        if conn is None:
+            conn = get_db_connection()
+        with conn:
+            cursor = conn.cursor()
+            cursor.executemany(_SQL_UPDATE_COMMAND, rows)
+
+            cursor.executemany(
+                _SQL_DELETE_TAGS_FOR_COMMAND,
+                [(e.id,) for e in entries]
+            )
+            tag_rows = [(e.id, tag) for e in entries for tag in (e.tags or [])]
+            if tag_rows:
+                cursor.executemany(_SQL_INSERT_TAG, tag_rows)
+            return len(entries)
+    except sqlite3.Error as e:
+        logger.error("Database error occurred when bulk-updating commands: %s", e)
+        return 0
+
+
 def clear_all_commands() -> bool:
     """
     Clear all data from saved_commands and commands_fts tables.
@@ -122,16 +518,13 @@ def clear_all_commands() -> bool:
     try:
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            
+
+            # The delete trigger clears the FTS index row by row; external
+            # content tables cannot be DELETEd from directly.
             cursor.execute("DELETE FROM saved_commands")
             deleted_saved = cursor.rowcount
-            
-            cursor.execute("DELETE FROM commands_fts")
-            deleted_fts = cursor.rowcount
-            
-            # cursor.execute("INSERT INTO commands_fts(commands_fts) VALUES('vacuum')")
 
-            conn.commit() 
+            conn.commit()
             return True
     except sqlite3.Error as e:
         raise sqlite3.Error(f"Database error occurred when clearing commands: {e}")
@@ -139,20 +532,33 @@ def clear_all_commands() -> bool:
         raise ex
 
 
+# Known model fields, so stray SELECT columns (e.g. search_text) are dropped
+# before construction.
+_ENTRY_FIELDS = frozenset(models.CommandEntry.model_fields)
+
 def _row_to_command_entry(row: sqlite3.Row) -> Optional[models.CommandEntry]:
     """Helper function: Convert sqlite3.Row to CommandEntry Pydantic model instance (MVP version)."""
     if row is None:
         return None
-    
-    data = dict(row)
-    
-    tags_json = data.get('tags')
-    data['tags'] = json.loads(tags_json) if tags_json else []
-    
+
+    data = {key: row[key] for key in row.keys() if key in _ENTRY_FIELDS}
+
+    tags_raw = data.get('tags')
+    if not tags_raw:
+        data['tags'] = []
+    elif tags_raw.startswith('['):
+        # Legacy JSON column, only seen mid-migration inside create_tables.
+        data['tags'] = json.loads(tags_raw)
+    else:
+        data['tags'] = tags_raw.split('\x1f')
+
     try:
-        return models.CommandEntry(**data)
+        # model_construct skips Pydantic validation — these rows come out of
+        # our own schema-constrained tables, so re-validating every read is
+        # pure overhead. Write paths still construct with full validation.
+        return models.CommandEntry.model_construct(**data)
     except Exception as e:
-        print(f"Error creating CommandEntry model from DB row: {e}, data: {dict(row)}")
+        logger.error("Error creating CommandEntry model from DB row: %s, data: %s", e, dict(row))
         return None
 
 def get_command_by_id(command_id: str) -> Optional[models.CommandEntry]:
@@ -160,118 +566,146 @@ def get_command_by_id(command_id: str) -> Optional[models.CommandEntry]:
     try:
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT * FROM saved_commands WHERE id = ?", (command_id,))
+            cursor.execute(_SQL_SELECT_BY_ID, (command_id,))
             row = cursor.fetchone()
             return _row_to_command_entry(row)
     except sqlite3.Error as e:
-        print(f"Database error occurred when getting command by ID: {e}")
+        logger.error("Database error occurred when getting command by ID: %s", e)
         return None
 
+def get_commands_by_ids(command_ids: List[str]) -> List[models.CommandEntry]:
+    """
+    Retrieve many command records with a single WHERE id IN (...) query.
+    Results are returned in the order of command_ids (missing ids skipped),
+    so FTS ranking order is preserved.
+    """
+    if not command_ids:
+        return []
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            placeholders = ", ".join("?" * len(command_ids))
+            cursor.execute(
+                f"SELECT sc.*, {_TAGS_SUBSELECT} AS tags FROM saved_commands sc WHERE sc.id IN ({placeholders})",
+                command_ids
+            )
+            by_id = {}
+            for row in cursor.fetchall():
+                entry = _row_to_command_entry(row)
+                if entry:
+                    by_id[entry.id] = entry
+            return [by_id[cid] for cid in command_ids if cid in by_id]
+    except sqlite3.Error as e:
+        logger.error("Database error occurred when getting commands by IDs: %s", e)
+        return []
+
 def get_command_by_raw_command(raw_command: str) -> Optional[models.CommandEntry]:
     """Retrieve single command record from database by raw command string."""
     try:
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT * FROM saved_commands WHERE raw_command = ?", (raw_command,))
+            cursor.execute(_SQL_SELECT_BY_RAW_COMMAND, (raw_command,))
             row = cursor.fetchone()
             return _row_to_command_entry(row)
     except sqlite3.Error as e:
-        print(f"Database error occurred when getting command by raw command: {e}")
+        logger.error("Database error occurred when getting command by raw command: %s", e)
         return None
 
+def iter_all_commands(limit: Optional[int] = None, offset: int = 0) -> Iterator[models.CommandEntry]:
+    """
+    Stream all commands one at a time, newest first. The sqlite3 cursor is
+    itself a row iterator fed from the VDBE, so nothing is materialized here
+    and consumers that walk the history once (indexers, exporters) avoid
+    holding every entry in memory at the same time.
+    """
+    try:
+        cursor = get_db_connection().cursor()
+        sql = _SQL_SELECT_ALL
+        params = []
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params.extend([limit, offset])
+
+        cursor.execute(sql, params)
+        for row in cursor:
+            entry = _row_to_command_entry(row)
+            if entry:
+                yield entry
+    except sqlite3.Error as e:
+        logger.error("An error occured when getting commands from DB: %s", e)
+
 def get_all_commands(limit: Optional[int] = None, offset: int = 0) -> List[models.CommandEntry]:
     # """Retrieve all command records from database with pagination support."""
     """
     get all commands from the database.
     """
-    commands = []
+    return list(iter_all_commands(limit=limit, offset=offset))
+
+def get_all_raw_commands() -> List[str]:
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            sql = "SELECT * FROM saved_commands ORDER BY added_timestamp DESC"
-            params = []
-            if limit is not None:
-                sql += " LIMIT ? OFFSET ?"
-                params.extend([limit, offset])
-            
-            cursor.execute(sql, params)
-            rows = cursor.fetchall()
-            for row in rows:
-                entry = _row_to_command_entry(row)
-                if entry:
-                    commands.append(entry)
-        return commands
+        cursor = get_db_connection().cursor()
+        # Single-column SELECT: bypass the Row factory so each row is the
+        # bare string — no Row allocation, no column-name lookup per row.
+        cursor.row_factory = lambda _cursor, row: row[0]
+        return cursor.execute("SELECT raw_command FROM saved_commands").fetchall()
     except sqlite3.Error as e:
-        print(f"An error occured when getting commands from DB: {e}")
+        logger.error("An error occured when get commands from DB: %s", e)
         return []
 
-def get_all_raw_commands() -> List[str]:
-    raw_commands = []
+def get_raw_command_id_map(conn: Optional[sqlite3.Connection] = None) -> Dict[str, str]:
+    """
+    Fetch {raw_command: id} for all stored commands in a single query.
+    Lets callers resolve existing entries without one SELECT per command.
+    A shared connection (see session()) can be passed to avoid reconnecting.
+    """
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT raw_command FROM saved_commands")
-            rows = cursor.fetchall()
-            for row in rows:
-                raw_commands.append(row['raw_command'])
-        return raw_commands
+        if conn is None:
+            conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT raw_command, id FROM saved_commands")
+        return {row['raw_command']: row['id'] for row in cursor.fetchall()}
     except sqlite3.Error as e:
-        print(f"An error occured when get commands from DB: {e}")
-        return []
+        logger.error("An error occured when getting raw command ids from DB: %s", e)
+        return {}
 
 def update_command(command_id: str, updated_entry_data: models.CommandEntry) -> bool:
     """
     Update a command in the database by its ID.
     No embedding now (MVP version).
     """
-    tags_json = json.dumps(updated_entry_data.tags or [])
-
     try:
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            
-            sql = """
-                UPDATE saved_commands SET
-                    raw_command = ?,
-                    processed_command = ?,
-                    description = ?,
-                    tags = ?,
-                    source = ?,
-                    history_timestamp = ? ,
-                    which_info = ?,
-                    help_info = ?,
-                    man_info = ?
-                    /* added_timestamp always created when the table created */
-                WHERE id = ?
-            """
+
+            # added_timestamp is left untouched (set once at insert time)
             params = (
                 updated_entry_data.raw_command,
                 updated_entry_data.processed_command,
                 updated_entry_data.description,
-                tags_json,
                 updated_entry_data.source,
                 updated_entry_data.history_timestamp,
-                updated_entry_data.which_info,   
-                updated_entry_data.help_info,  
-                updated_entry_data.man_info, 
+                updated_entry_data.which_info,
+                updated_entry_data.help_info,
+                updated_entry_data.man_info,
+                updated_entry_data.get_searchable_text(),
                 command_id
             )
-            cursor.execute(sql, params)
+            cursor.execute(_SQL_UPDATE_COMMAND, params)
 
             if cursor.rowcount == 0:
-                print(f"Update failed: No command found with ID {command_id}.")
+                logger.warning("Update failed: No command found with ID %s.", command_id)
                 return False
 
-            cursor.execute("DELETE FROM commands_fts WHERE command_id = ?", (command_id,))
-            searchable_text = updated_entry_data.get_searchable_text()
-            cursor.execute(
-                "INSERT INTO commands_fts (command_id, search_text) VALUES (?, ?)",
-                (command_id, searchable_text)
-            )
-            print(f"Successfully updated command with ID: {command_id}")
+            cursor.execute(_SQL_DELETE_TAGS_FOR_COMMAND, (command_id,))
+            if updated_entry_data.tags:
+                cursor.executemany(
+                    _SQL_INSERT_TAG,
+                    [(command_id, tag) for tag in updated_entry_data.tags]
+                )
+            logger.debug("Successfully updated command with ID: %s", command_id)
             return True
     except sqlite3.Error as e:
-        print(f"An error occurred when updating the DB: {e}")
+        logger.error("An error occurred when updating the DB: %s", e)
         return False
 
 
@@ -283,14 +717,13 @@ def delete_command(command_id: str) -> bool:
             
             cursor.execute("DELETE FROM saved_commands WHERE id = ?", (command_id,))
             if cursor.rowcount == 0:
-                print(f"Delete failed: No command found with ID {command_id}.")
+                logger.warning("Delete failed: No command found with ID %s.", command_id)
                 return False
 
-            cursor.execute("DELETE FROM commands_fts WHERE command_id = ?", (command_id,))
-            print(f"{command_id} deleted")
+            logger.debug("%s deleted", command_id)
             return True
     except sqlite3.Error as e:
-        print(f"An error occured when deleting the DB: {e}")
+        logger.error("An error occured when deleting the DB: %s", e)
         return False
 
 # --- FTS5 ---
@@ -305,23 +738,38 @@ def search_commands_fts(query_text: str, top_k: int = config.DEFAULT_TOP_K_RESUL
     try:
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            sql = """
-                SELECT command_id, rank 
-                FROM commands_fts 
-                WHERE search_text MATCH ? 
-                ORDER BY bm25(commands_fts) 
-                LIMIT ?
-            """
-            cursor.execute(sql, (query_text, top_k))
+            # External-content FTS keys rows by saved_commands.rowid, so the
+            # join recovers the TEXT id callers expect.
+            cursor.execute(_SQL_SEARCH_FTS, (query_text, top_k))
             rows = cursor.fetchall()
             for row in rows:
-                results.append((row['command_id'], row['rank'])) 
+                results.append((row['command_id'], row['rank']))
         return results
     except sqlite3.Error as e:
         # print(f"{e}")
         return []
 
 
+def search_commands(query_text: str, top_k: int = config.DEFAULT_TOP_K_RESULTS) -> List[models.CommandEntry]:
+    """
+    FTS search returning fully hydrated entries in rank order.
+    One statement joins the index hit straight to its saved_commands row,
+    so callers avoid a second round-trip to resolve the matched ids.
+    """
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(_SQL_SEARCH_HYDRATED, (query_text, top_k))
+            entries = []
+            for row in cursor.fetchall():
+                entry = _row_to_command_entry(row)
+                if entry:
+                    entries.append(entry)
+            return entries
+    except sqlite3.Error:
+        return []
+
+
 # --- Test MVP ---
 if __name__ == "__main__":
     print("Initializing database and tables (MVP schema)...")
@@ -1,6 +1,6 @@
 # clihunter/history_parser.py
+import mmap
 import os
-import re
 import time
 from pathlib import Path
 from typing import List, Dict, Optional, Any, Callable
@@ -8,62 +8,133 @@ from typing import List, Dict, Optional, Any, Callable
 # Import config from project, we'll use SHELL_HISTORY_FILES
 from . import config
 
-# Type alias for return data structure
-HistoryEntry = Dict[str, Any] # Typically contains 'command': str and 'timestamp': Optional[int]
+# Optional: fish history is YAML-shaped, and PyYAML's libyaml backend parses
+# it at C speed. The hand-rolled line loop below remains as the fallback for
+# environments without PyYAML or for files the YAML parser rejects.
+try:
+    import yaml
+    try:
+        from yaml import CSafeLoader as _YamlLoader  # libyaml C extension
+    except ImportError:
+        from yaml import SafeLoader as _YamlLoader
+except ImportError:
+    yaml = None
+    _YamlLoader = None
+
+class HistoryEntry:
+    """
+    One parsed history entry. __slots__ keeps the per-entry footprint to a
+    few references instead of a dict with its hash-table overhead — large
+    histories run to hundreds of thousands of entries.
+    'count' is how often the command appeared; it only diverges from 1
+    after dedupe_history().
+    """
+    __slots__ = ("command", "timestamp", "count")
+
+    def __init__(self, command: str, timestamp: Optional[int] = None, count: int = 1):
+        self.command = command
+        self.timestamp = timestamp
+        self.count = count
+
+    def __repr__(self) -> str:
+        return f"HistoryEntry(command={self.command!r}, timestamp={self.timestamp!r}, count={self.count!r})"
+
+    def __eq__(self, other) -> bool:
+        return (
+            isinstance(other, HistoryEntry)
+            and self.command == other.command
+            and self.timestamp == other.timestamp
+            and self.count == other.count
+        )
+
+
+def _tail_lines(file_path: Path, n: int, block: int = 65536) -> List[str]:
+    """
+    Return the last n lines of a file by reading fixed-size blocks backwards
+    from the end. A huge history file with num_entries=200 then costs a few
+    pread calls instead of reading and allocating the whole file.
+    """
+    fd = os.open(str(file_path), os.O_RDONLY)
+    try:
+        pos = os.lseek(fd, 0, os.SEEK_END)
+        chunks: List[bytes] = []
+        newlines = 0
+        while pos > 0 and newlines <= n:
+            read_size = min(block, pos)
+            pos -= read_size
+            chunk = os.pread(fd, read_size, pos)
+            newlines += chunk.count(b"\n")
+            chunks.append(chunk)
+        data = b"".join(reversed(chunks))
+    finally:
+        os.close(fd)
+    lines = data.decode('utf-8', errors='ignore').splitlines()
+    return lines[-n:]
+
+
+def _iter_file_lines(file_path: Path):
+    """
+    Yield decoded lines from a memory-mapped file. Unlike readlines(), this
+    never materializes the whole file as one buffer plus a list of strings;
+    pages are faulted in as the parse advances and only the line being
+    processed is decoded.
+    """
+    with open(file_path, 'rb') as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return  # empty file cannot be mapped
+        with mm:
+            for line in iter(mm.readline, b""):
+                yield line.decode('utf-8', errors='ignore')
 
 # --- Zsh History Parsing (supports extended format) ---
 # Zsh extended history format is typically: ": <timestamp>:<duration>;<command>"
 # Example: ": 1678886400:0;ls -l"
-ZSH_EXTENDED_HISTORY_REGEX = re.compile(r":\s*(\d+):(\d+);(.*)")
+# The format is anchored and trivial, so it is decoded with startswith/find/
+# int on slices rather than a regex — one less C-call per history line.
 
 def _parse_zsh_history(file_path: Path, num_entries: Optional[int] = None) -> List[HistoryEntry]:
-    """Parse Zsh history file."""
+    """Parse Zsh history file. The caller (load_history) checks existence."""
     entries: List[HistoryEntry] = []
-    if not file_path.exists():
-        print(f"Zsh history file not found: {file_path}")
-        return entries
-
-    lines: List[str] = []
     try:
-        # Read all lines, then take last N if needed
-        with open(file_path, 'r', errors='ignore') as f: # errors='ignore' to handle potential encoding issues
-            lines = f.readlines()
+        if num_entries is not None and num_entries > 0:
+            # Only the tail is needed: read backwards instead of loading the file
+            lines = _tail_lines(file_path, num_entries)
+        else:
+            # Full scan: stream lines off an mmap instead of materializing
+            # the whole file with readlines()
+            lines = _iter_file_lines(file_path)
+
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+
+            colon = line.find(":", 1) if line.startswith(":") else -1
+            semi = line.find(";", colon + 1) if colon != -1 else -1
+            if semi != -1 and line[1:colon].strip().isdigit() and line[colon + 1:semi].isdigit():
+                timestamp = int(line[1:colon])
+                command = line[semi + 1:]
+                if command: # ": <ts>:0;" with nothing after the semicolon
+                    entries.append(HistoryEntry(command, timestamp))
+            else:
+                # If not extended format, treat as normal command (may have no timestamp)
+                # Zsh may also have multi-line commands, usually connected with backslash `\`,
+                # but in history files they may be merged or recorded specially.
+                # Here we simply treat as single line.
+                # If command starts with ": " but isn't standard extended format,
+                # it may be written by some plugin/config, we try to remove it.
+                if line.startswith(": ") and len(line) > 2 and line[2].isdigit(): # Avoid false positives
+                    pass # Already handled by the extended-format branch or doesn't match
+
+                # Simple multi-line command handling: if line ends with '\', it usually means continuation
+                # But in history files they may already be merged
+                # Here we assume lines in history file are already complete commands
+                entries.append(HistoryEntry(line))
     except Exception as e:
         print(f"Error reading Zsh history file ({file_path}): {e}")
-        return entries
-        
-    if num_entries is not None and num_entries > 0:
-        lines = lines[-num_entries:]
 
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-        
-        match = ZSH_EXTENDED_HISTORY_REGEX.match(line)
-        if match:
-            timestamp_str, _, command = match.groups()
-            try:
-                timestamp = int(timestamp_str)
-                entries.append({"command": command, "timestamp": timestamp})
-            except ValueError:
-                # If timestamp can't be parsed, still record command with None timestamp
-                entries.append({"command": command, "timestamp": None})
-        else:
-            # If not extended format, treat as normal command (may have no timestamp)
-            # Zsh may also have multi-line commands, usually connected with backslash `\`,
-            # but in history files they may be merged or recorded specially.
-            # Here we simply treat as single line.
-            # If command starts with ": " but isn't standard extended format,
-            # it may be written by some plugin/config, we try to remove it.
-            if line.startswith(": ") and len(line) > 2 and line[2].isdigit(): # Avoid false positives
-                pass # Already handled by ZSH_EXTENDED_HISTORY_REGEX or doesn't match
-            
-            # Simple multi-line command handling: if line ends with '\', it usually means continuation
-            # But in history files they may already be merged
-            # Here we assume lines in history file are already complete commands
-            entries.append({"command": line, "timestamp": None})
-            
     return entries
 
 
@@ -72,49 +143,54 @@ def _parse_zsh_history(file_path: Path, num_entries: Optional[int] = None) -> Li
 # Example:
 # #1678886400
 # ls -l
-BASH_TIMESTAMP_REGEX = re.compile(r"#(\d+)")
-
-def _parse_bash_history(file_path: Path, num_entries: Optional[int] = None) -> List[HistoryEntry]:
-    """Parse Bash history file."""
-    entries: List[HistoryEntry] = []
-    if not file_path.exists():
-        print(f"Bash history file not found: {file_path}")
-        return entries
-
-    lines: List[str] = []
-    try:
-        with open(file_path, 'r', errors='ignore') as f:
-            lines = f.readlines()
-    except Exception as e:
-        print(f"Error reading Bash history file ({file_path}): {e}")
-        return entries
-
-    # If num_entries is specified, we need a way to get last N commands with their timestamps
-    # Bash timestamps are on the line before commands, making this more complex than Zsh
-    # For simplicity, if num_entries is specified, we parse fully then take last N
-    # A more optimized approach would be reading file backwards, but that adds complexity
 
+def _scan_bash_lines(lines) -> List[HistoryEntry]:
+    """Run the bash timestamp/command state machine over an iterable of lines."""
     current_timestamp: Optional[int] = None
-    parsed_entries_temp: List[HistoryEntry] = []
-
+    parsed: List[HistoryEntry] = []
     for line in lines:
         line = line.strip()
         if not line:
             continue
-        
-        timestamp_match = BASH_TIMESTAMP_REGEX.match(line)
-        if timestamp_match:
-            try:
-                current_timestamp = int(timestamp_match.group(1))
-            except ValueError:
-                current_timestamp = None # Reset if parsing fails
+
+        if line[:1] == "#" and line[1:].isdigit():
+            current_timestamp = int(line[1:])
         else:
             # This line is a command
             # Bash multi-line commands are usually merged into one line in history,
             # or only first line is recorded.
             # If HISTCONTROL contains ignorespace, commands starting with space aren't recorded.
-            parsed_entries_temp.append({"command": line, "timestamp": current_timestamp})
+            parsed.append(HistoryEntry(line, current_timestamp))
             current_timestamp = None # Timestamp only applies to next command
+    return parsed
+
+
+def _parse_bash_history(file_path: Path, num_entries: Optional[int] = None) -> List[HistoryEntry]:
+    """Parse Bash history file. The caller (load_history) checks existence."""
+    entries: List[HistoryEntry] = []
+    parsed_entries_temp: List[HistoryEntry] = []
+
+    try:
+        if num_entries is not None and num_entries > 0:
+            # Bash timestamps sit on the line before each command, so start
+            # with a 2x overshoot window. If the tail held fewer commands than
+            # asked for (dense runs of '#' lines), double the window and
+            # rescan until satisfied or the whole file has been read. Memory
+            # stays O(window) instead of O(file).
+            window = num_entries * 2 + 32
+            while True:
+                lines = _tail_lines(file_path, window)
+                parsed_entries_temp = _scan_bash_lines(lines)
+                if len(parsed_entries_temp) >= num_entries or len(lines) < window:
+                    break
+                window *= 2
+        else:
+            # Full scan: stream lines off an mmap instead of materializing
+            # the whole file with readlines()
+            parsed_entries_temp = _scan_bash_lines(_iter_file_lines(file_path))
+    except Exception as e:
+        print(f"Error reading Bash history file ({file_path}): {e}")
+        return entries
 
     if num_entries is not None and num_entries > 0:
         entries = parsed_entries_temp[-num_entries:]
@@ -134,71 +210,98 @@ def _parse_bash_history(file_path: Path, num_entries: Optional[int] = None) -> L
 #   when: 1678886401
 
 def _parse_fish_history(file_path: Path, num_entries: Optional[int] = None) -> List[HistoryEntry]:
-    """Parse Fish Shell history file."""
+    """Parse Fish Shell history file. The caller (load_history) checks existence."""
     entries: List[HistoryEntry] = []
-    if not file_path.exists():
-        print(f"Fish history file not found: {file_path}")
-        return entries
 
     # Fish history files are UTF-8 encoded and have a specific structure
     # We use simple line matching here, but for very complex Fish history
     # (like multi-line command representations), a more robust YAML parser
     # or more complex regex might be needed.
     
-    # Read all lines
-    all_lines: List[str] = []
+    # Read the file once; the YAML fast path and the fallback loop share it
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
-            all_lines = f.readlines()
+            content = f.read()
     except Exception as e:
         print(f"Error reading Fish history file ({file_path}): {e}")
         return entries
-        
-    current_cmd: Optional[str] = None
+
+    if yaml is not None:
+        try:
+            docs = yaml.load(content, Loader=_YamlLoader)
+        except yaml.YAMLError:
+            docs = None  # Not clean YAML (fish only approximates it): fall back
+        if isinstance(docs, list):
+            for doc in docs:
+                if not isinstance(doc, dict):
+                    continue
+                cmd = doc.get("cmd")
+                if cmd is None:
+                    continue
+                cmd_str = str(cmd).strip()
+                if not cmd_str:
+                    continue
+                when = doc.get("when")
+                entries.append(HistoryEntry(cmd_str, when if isinstance(when, int) else None))
+            if num_entries is not None and num_entries > 0:
+                entries = entries[-num_entries:]
+            return entries
+
+    all_lines: List[str] = content.splitlines(keepends=True)
+
+    # Accumulate multi-line commands in a list and join once on commit: a
+    # long multi-line command built with += copies the growing string on
+    # every continuation line (O(N^2)); the join is linear.
+    current_cmd_parts: Optional[List[str]] = None
     is_multiline_cmd = False
-    
+
     parsed_entries_temp: List[HistoryEntry] = []
 
     for line_raw in all_lines:
         line = line_raw.strip() # Handle line endings
-        line_unstripped_indent = len(line_raw) - len(line_raw.lstrip()) # Preserve original indentation
 
         if line.startswith("- cmd:"):
-            if current_cmd is not None: # Previous command ended without 'when' (unlikely but protected)
-                parsed_entries_temp.append({"command": current_cmd.strip(), "timestamp": None})
-                current_cmd = None
+            if current_cmd_parts is not None: # Previous command ended without 'when' (unlikely but protected)
+                command = "".join(current_cmd_parts).strip()
+                if command:
+                    parsed_entries_temp.append(HistoryEntry(command))
+                current_cmd_parts = None
                 is_multiline_cmd = False
 
             cmd_part = line[len("- cmd:"):].strip()
             if cmd_part == "|": # Start multi-line command
-                current_cmd = ""
+                current_cmd_parts = []
                 is_multiline_cmd = True
             else:
-                current_cmd = cmd_part
+                current_cmd_parts = [cmd_part]
                 is_multiline_cmd = False
-        elif line.startswith("when:") and current_cmd is not None:
-            try:
-                timestamp_str = line[len("when:"):].strip()
-                timestamp = int(timestamp_str)
-                parsed_entries_temp.append({"command": current_cmd.strip(), "timestamp": timestamp})
-            except ValueError:
-                parsed_entries_temp.append({"command": current_cmd.strip(), "timestamp": None})
-            current_cmd = None # Command processing complete
+        elif line.startswith("when:") and current_cmd_parts is not None:
+            command = "".join(current_cmd_parts).strip()
+            if command:
+                try:
+                    timestamp_str = line[len("when:"):].strip()
+                    timestamp = int(timestamp_str)
+                    parsed_entries_temp.append(HistoryEntry(command, timestamp))
+                except ValueError:
+                    parsed_entries_temp.append(HistoryEntry(command))
+            current_cmd_parts = None # Command processing complete
             is_multiline_cmd = False
-        elif is_multiline_cmd and current_cmd is not None:
+        elif is_multiline_cmd and current_cmd_parts is not None:
             # Handle multi-line command content, respecting indentation
             # Fish multi-line commands typically have extra indentation
-            # We assume continuation lines have at least 2 spaces of indentation
-            if line_unstripped_indent >= 2: # Heuristic rule
-                 current_cmd += line_raw.lstrip() # Keep relative indentation, remove alignment spaces
+            # Continuation lines start with at least 2 spaces (or a tab)
+            if line_raw.startswith(("  ", "\t")): # Heuristic rule
+                current_cmd_parts.append(line_raw.lstrip()) # Keep relative indentation, remove alignment spaces
             else: # Incorrect indentation, likely end of multi-line command
-                is_multiline_cmd = False 
+                is_multiline_cmd = False
                 # If current_cmd exists without 'when', could decide to save it here
                 # But standard Fish format should have 'when', so we can ignore this case
-                
+
     # If file ends with a command but no accompanying 'when' (unlikely)
-    if current_cmd is not None:
-        parsed_entries_temp.append({"command": current_cmd.strip(), "timestamp": None})
+    if current_cmd_parts is not None:
+        command = "".join(current_cmd_parts).strip()
+        if command:
+            parsed_entries_temp.append(HistoryEntry(command))
 
     if num_entries is not None and num_entries > 0:
         entries = parsed_entries_temp[-num_entries:]
@@ -215,10 +318,31 @@ SHELL_PARSERS: Dict[str, Callable[[Path, Optional[int]], List[HistoryEntry]]] =
     "fish": _parse_fish_history,
 }
 
+def dedupe_history(entries: List[HistoryEntry]) -> List[HistoryEntry]:
+    """
+    Collapse repeated commands into one entry each, keeping the most recent
+    timestamp and recording how often the command appeared in a 'count'
+    field. Real histories repeat the same commands constantly, so anything
+    paying per-entry cost downstream (LLM enrichment above all) shrinks by
+    the dedupe factor.
+    """
+    by_cmd: Dict[str, HistoryEntry] = {}
+    for entry in entries:
+        current = by_cmd.get(entry.command)
+        if current is None:
+            by_cmd[entry.command] = HistoryEntry(entry.command, entry.timestamp)
+        else:
+            current.count += 1
+            if (entry.timestamp or 0) > (current.timestamp or 0):
+                current.timestamp = entry.timestamp
+    return list(by_cmd.values())
+
+
 def load_history(
-    shell_type: str, 
-    num_entries: Optional[int] = None, 
-    custom_hist_file: Optional[str] = None
+    shell_type: str,
+    num_entries: Optional[int] = None,
+    custom_hist_file: Optional[str] = None,
+    dedupe: bool = False
 ) -> List[HistoryEntry]:
     """
     Load history for specified shell type.
@@ -227,10 +351,11 @@ def load_history(
         shell_type (str): Shell type, e.g. 'bash', 'zsh', 'fish'.
         num_entries (Optional[int]): Number of recent history entries to load. If None, load all.
         custom_hist_file (Optional[str]): Optional custom history file path. If provided, ignores default path.
+        dedupe (bool): If True, collapse duplicate commands via dedupe_history().
 
     Returns:
-        List[HistoryEntry]: List of history entry dictionaries.
-                           Each dict contains 'command' (str) and 'timestamp' (Optional[int]).
+        List[HistoryEntry]: List of history entries, each carrying
+                           'command' (str) and 'timestamp' (Optional[int]).
     """
     shell_type = shell_type.lower()
     
@@ -257,13 +382,16 @@ def load_history(
     entries = parser_func(hist_file_path, num_entries)
     duration = time.time() - start_time
     print(f"Loaded {len(entries)} commands from {shell_type} history in {duration:.2f} seconds.")
-    
-    # Simple post-processing: remove completely empty commands (if parser might produce them)
-    valid_entries = [e for e in entries if e.get("command", "").strip()]
-    if len(valid_entries) != len(entries):
-        print(f"Removed {len(entries) - len(valid_entries)} empty commands.")
 
-    return valid_entries
+    # Empty commands are already dropped inside each parser loop, so no
+    # second filtering pass over the list is needed here.
+    if dedupe:
+        deduped = dedupe_history(entries)
+        if len(deduped) != len(entries):
+            print(f"Collapsed {len(entries) - len(deduped)} duplicate commands.")
+        return deduped
+
+    return entries
 
 
 # --- Test code when run as main module ---
@@ -0,0 +1,80 @@
+# clihunter/llm_cache.py
+import sqlite3
+import zlib
+from typing import Optional
+
+from . import config
+
+# Small SQLite-backed cache for deterministic-enough LLM helper calls
+# (translation, query enhancement). A hit replaces a network round-trip
+# with one local SELECT. Lives next to other state under XDG_STATE_HOME.
+CACHE_DB_PATH = config.APP_STATE_DIR / "llm_cache.db"
+
+# Entries older than this are treated as misses (and lazily overwritten).
+DEFAULT_TTL_SECONDS = 30 * 24 * 3600
+
+# Values at or beyond this many encoded bytes are stored zlib-compressed
+# (as BLOBs; short values stay plain TEXT). Cached LLM output is redundant
+# English prose, so the descriptions that dominate the cache shrink several
+# fold, cutting cache-file I/O and page-cache footprint.
+_COMPRESS_MIN_BYTES = 256
+
+
+def _get_cache_connection() -> sqlite3.Connection:
+    conn = sqlite3.connect(str(CACHE_DB_PATH))
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            fn_name TEXT NOT NULL,
+            cache_key TEXT NOT NULL,
+            value TEXT,
+            created_timestamp INTEGER DEFAULT (STRFTIME('%s', 'now')),
+            PRIMARY KEY (fn_name, cache_key)
+        )
+    """)
+    return conn
+
+
+def get(fn_name: str, cache_key: str, max_age: int = DEFAULT_TTL_SECONDS) -> Optional[str]:
+    """Return the cached value for (fn_name, cache_key), or None on miss/expiry."""
+    try:
+        with _get_cache_connection() as conn:
+            row = conn.execute(
+                """
+                SELECT value FROM llm_cache
+                WHERE fn_name = ? AND cache_key = ?
+                  AND created_timestamp >= STRFTIME('%s', 'now') - ?
+                """,
+                (fn_name, cache_key, max_age)
+            ).fetchone()
+            if row is None:
+                return None
+            value = row[0]
+            if isinstance(value, bytes):
+                return zlib.decompress(value).decode("utf-8")
+            return value
+    except (sqlite3.Error, zlib.error, UnicodeDecodeError):
+        return None  # A broken cache must never break the caller
+
+
+def put(fn_name: str, cache_key: str, value: str) -> None:
+    """Store (or refresh) the cached value for (fn_name, cache_key)."""
+    try:
+        stored = value
+        encoded = value.encode("utf-8")
+        if len(encoded) >= _COMPRESS_MIN_BYTES:
+            compressed = zlib.compress(encoded, 6)
+            if len(compressed) < len(encoded):
+                stored = compressed
+        with _get_cache_connection() as conn:
+            conn.execute(
+                """
+                INSERT INTO llm_cache (fn_name, cache_key, value)
+                VALUES (?, ?, ?)
+                ON CONFLICT(fn_name, cache_key) DO UPDATE SET
+                    value = excluded.value,
+                    created_timestamp = STRFTIME('%s', 'now')
+                """,
+                (fn_name, cache_key, stored)
+            )
+    except sqlite3.Error:
+        pass
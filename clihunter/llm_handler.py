@@ -1,12 +1,29 @@
 # clihunter/llm_handler.py
+import concurrent.futures
+import hashlib
 import json
+import string
 import requests
+from requests.adapters import HTTPAdapter
 from typing import List, Optional, Dict, Any
 
 from . import config
+from . import llm_cache
 from . import models
 from . import utils
 
+# Optional: orjson decodes/encodes JSON several times faster than the stdlib
+# (Rust parser). Its JSONDecodeError subclasses json.JSONDecodeError, so the
+# error handling below works with either implementation.
+try:
+    import orjson
+
+    def _json_loads(data): return orjson.loads(data)
+    def _json_dumps(obj) -> bytes: return orjson.dumps(obj)
+except ImportError:
+    def _json_loads(data): return json.loads(data)
+    def _json_dumps(obj) -> bytes: return json.dumps(obj).encode("utf-8")
+
 # --- Prompt Templates (English preferred) ---
 PROMPT_TEMPLATES = {
     "generate_description": """\
@@ -52,60 +69,175 @@ Generate a Shell command to complete the user's task (or briefly explain if unab
 """
 }
 
+def _precompile_prompt(template: str):
+    """
+    Split a format string into (literal, field) segments once, so rendering a
+    prompt is a join over precomputed pieces instead of re-parsing the
+    template on every call. generate_description runs per history entry
+    during indexing, so the parse cost adds up.
+    """
+    segments = [(literal, field) for literal, field, _spec, _conv in string.Formatter().parse(template)]
+
+    def render(**kwargs) -> str:
+        parts = []
+        for literal, field in segments:
+            if literal:
+                parts.append(literal)
+            if field is not None:
+                parts.append(str(kwargs[field]))
+        return "".join(parts)
+
+    return render
+
+_COMPILED_PROMPTS = {name: _precompile_prompt(tpl) for name, tpl in PROMPT_TEMPLATES.items()}
+
+# Shared session so repeated LLM calls reuse a warm keep-alive connection
+# instead of paying a TCP (and, for cloud providers, TLS) handshake each time.
+# pool_maxsize matches the fan-out of concurrent indexing workers.
+_SESSION = requests.Session()
+_SESSION.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=32))
+_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=32))
+
+# Payloads are serialized with _json_dumps and posted as raw bytes, so the
+# content type has to be set explicitly (requests only adds it for json=).
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# A sentence boundary followed by whitespace (or end-of-chunk newline) is
+# treated as "answer complete" when streaming with stop_on_sentence.
+_SENTENCE_ENDINGS = (". ", ".\n", "! ", "!\n", "? ", "?\n")
+
+def _stream_ollama_response(api_url: str, payload: Dict[str, Any]) -> str:
+    """
+    Stream an Ollama generation and close the connection at the first
+    sentence boundary. The server stops generating when the client hangs up,
+    so a one-sentence answer doesn't pay for the full max_tokens budget.
+    """
+    payload = dict(payload, stream=True)
+    buf = ""
+    response = _SESSION.post(api_url, data=_json_dumps(payload), headers=_JSON_HEADERS, timeout=60, stream=True)
+    try:
+        response.raise_for_status()
+        for raw_line in response.iter_lines():
+            if not raw_line:
+                continue
+            chunk_data = _json_loads(raw_line)
+            buf += chunk_data.get("response", "")
+            if chunk_data.get("done"):
+                break
+            if buf.endswith(_SENTENCE_ENDINGS):
+                break
+    finally:
+        response.close()
+    return buf.strip()
+
+def _stream_openai_response(api_url: str, headers: Dict[str, str], payload: Dict[str, Any]) -> str:
+    """Same early-stop streaming for the OpenAI-compatible SSE endpoint."""
+    payload = dict(payload, stream=True)
+    buf = ""
+    response = _SESSION.post(api_url, headers=headers, data=_json_dumps(payload), timeout=60, stream=True)
+    try:
+        response.raise_for_status()
+        for raw_line in response.iter_lines():
+            if not raw_line or not raw_line.startswith(b"data:"):
+                continue
+            data = raw_line[len(b"data:"):].strip()
+            if data == b"[DONE]":
+                break
+            chunk_data = _json_loads(data)
+            choices = chunk_data.get("choices") or []
+            if choices:
+                buf += (choices[0].get("delta") or {}).get("content") or ""
+            if buf.endswith(_SENTENCE_ENDINGS):
+                break
+    finally:
+        response.close()
+    return buf.strip()
+
+# The provider never changes within a process, so the URL, headers and base
+# payload are computed once and baked into a per-provider closure instead of
+# being rebuilt (with config lookups and string formatting) on every call.
+# Built lazily on the first call to keep config's deferred .env loading.
+_PROVIDER_IMPL: Optional[tuple] = None  # (provider_name, caller or None)
+
+def _build_ollama_caller():
+    api_url = f"{config.OLLAMA_BASE_URL.rstrip('/')}/api/generate"
+    base_payload = {"model": config.OLLAMA_MODEL_NAME, "stream": False}
+
+    def call(prompt, system_prompt, temperature, max_tokens, is_json_output, stop_on_sentence):
+        payload = dict(
+            base_payload, prompt=prompt,
+            options={"temperature": temperature, "num_predict": max_tokens}
+        )
+        if system_prompt: payload["system"] = system_prompt
+        if is_json_output: payload["format"] = "json"
+        if stop_on_sentence and not is_json_output:
+            return _stream_ollama_response(api_url, payload)
+        response = _SESSION.post(api_url, data=_json_dumps(payload), headers=_JSON_HEADERS, timeout=60)
+        response.raise_for_status()
+        return _json_loads(response.content).get("response", "").strip()
+
+    return call
+
+def _build_openai_caller():
+    api_base = (config.LLM_API_BASE_URL or "https://api.openai.com/v1").rstrip('/')
+    api_url = f"{api_base}/chat/completions"
+    is_official_openai = "api.openai.com" in api_base
+    headers = {"Content-Type": "application/json"}
+    if config.LLM_API_KEY and config.LLM_API_KEY.lower() not in ["none", "na", "no_key", ""]:
+        headers["Authorization"] = f"Bearer {config.LLM_API_KEY}"
+    elif is_official_openai:
+        print("Error: OpenAI API key (CLIHUNTER_LLM_API_KEY) is not set or invalid.")
+        return None
+    model = config.LLM_MODEL_NAME
+
+    def call(prompt, system_prompt, temperature, max_tokens, is_json_output, stop_on_sentence):
+        messages = []
+        if system_prompt: messages.append({"role": "system", "content": system_prompt})
+        messages.append({"role": "user", "content": prompt})
+        payload = {
+            "model": model, "messages": messages,
+            "temperature": temperature, "max_tokens": max_tokens,
+        }
+        if is_json_output: payload["response_format"] = {"type": "json_object"}
+        if stop_on_sentence and not is_json_output:
+            return _stream_openai_response(api_url, headers, payload)
+        response = _SESSION.post(api_url, headers=headers, data=_json_dumps(payload), timeout=60)
+        response.raise_for_status()
+        choices = _json_loads(response.content).get("choices")
+        if choices and isinstance(choices, list) and len(choices) > 0:
+            message = choices[0].get("message")
+            if message and isinstance(message, dict): return message.get("content", "").strip()
+            print(f"Warning: Unexpected 'message' structure in LLM response: {message}")
+        else:
+            print(f"Warning: Unexpected or empty 'choices' structure in LLM response: {choices}")
+        return None
+
+    return call
+
+_PROVIDER_BUILDERS = {"ollama": _build_ollama_caller, "openai": _build_openai_caller}
+
+def _get_provider_impl() -> tuple:
+    global _PROVIDER_IMPL
+    if _PROVIDER_IMPL is None:
+        provider = config.LLM_PROVIDER.lower()
+        builder = _PROVIDER_BUILDERS.get(provider)
+        _PROVIDER_IMPL = (provider, builder() if builder else None)
+    return _PROVIDER_IMPL
+
 def _call_llm_api(
     prompt: str,
     system_prompt: Optional[str] = None,
     temperature: float = 0.2,
     max_tokens: int = 200,
-    is_json_output: bool = False
+    is_json_output: bool = False,
+    stop_on_sentence: bool = False
 ) -> Optional[Any]:
-    provider = config.LLM_PROVIDER.lower()
-    response_text: Optional[str] = None
-    # print(f"DEBUG: Calling LLM. Provider: {provider}, JSON output: {is_json_output}, Prompt: {prompt[:150]}...")
+    provider, impl = _get_provider_impl()
+    if impl is None:
+        print(f"Error: Unsupported LLM provider '{provider}' or missing configuration.")
+        return None
     try:
-        if provider == "ollama":
-            api_url = f"{config.OLLAMA_BASE_URL.rstrip('/')}/api/generate"
-            payload = {
-                "model": config.OLLAMA_MODEL_NAME, "prompt": prompt, "stream": False,
-                "options": {"temperature": temperature, "num_predict": max_tokens}
-            }
-            if system_prompt: payload["system"] = system_prompt
-            if is_json_output: payload["format"] = "json"
-            response = requests.post(api_url, json=payload, timeout=60)
-            response.raise_for_status()
-            response_data = response.json()
-            response_text = response_data.get("response", "").strip()
-
-        elif provider == "openai":
-            api_base = (config.LLM_API_BASE_URL or "https://api.openai.com/v1").rstrip('/')
-            api_url = f"{api_base}/chat/completions"
-            is_official_openai = "api.openai.com" in api_base
-            headers = {"Content-Type": "application/json"}
-            if config.LLM_API_KEY and config.LLM_API_KEY.lower() not in ["none", "na", "no_key", ""]:
-                headers["Authorization"] = f"Bearer {config.LLM_API_KEY}"
-            elif is_official_openai:
-                print("Error: OpenAI API key (CLIHUNTER_LLM_API_KEY) is not set or invalid.")
-                return None
-            messages = []
-            if system_prompt: messages.append({"role": "system", "content": system_prompt})
-            messages.append({"role": "user", "content": prompt})
-            payload = {
-                "model": config.LLM_MODEL_NAME, "messages": messages,
-                "temperature": temperature, "max_tokens": max_tokens,
-            }
-            if is_json_output: payload["response_format"] = {"type": "json_object"}
-            response = requests.post(api_url, headers=headers, json=payload, timeout=60)
-            response.raise_for_status()
-            response_data = response.json()
-            choices = response_data.get("choices")
-            if choices and isinstance(choices, list) and len(choices) > 0:
-                message = choices[0].get("message")
-                if message and isinstance(message, dict): response_text = message.get("content", "").strip()
-                else: print(f"Warning: Unexpected 'message' structure in LLM response: {message}")
-            else: print(f"Warning: Unexpected or empty 'choices' structure in LLM response: {choices}")
-        else:
-            print(f"Error: Unsupported LLM provider '{provider}'.")
-            return None
+        response_text = impl(prompt, system_prompt, temperature, max_tokens, is_json_output, stop_on_sentence)
 
         if response_text is None:
              print(f"Warning: LLM ({provider}) returned no valid content.")
@@ -115,8 +247,8 @@ def _call_llm_api(
             try:
                 if provider == "ollama" and response_text.startswith("```json"):
                     cleaned_json_text = response_text.split("```json\n", 1)[-1].rsplit("\n```", 1)[0]
-                    return json.loads(cleaned_json_text)
-                return json.loads(response_text)
+                    return _json_loads(cleaned_json_text)
+                return _json_loads(response_text)
             except json.JSONDecodeError as e:
                 print(f"LLM API error: Expected JSON but parsing failed. Error: {e}\nRaw text: {response_text}")
                 return None
@@ -143,29 +275,86 @@ def generate_description(
     """
     Use LLM to generate an **English** description for the given Shell command.
     Can accept additional command context (which, help, man) to assist generation.
+    Results are cached on disk keyed by a hash of the command and its context,
+    so duplicate commands and re-runs skip the network round-trip.
     command_text: The command text to describe (e.g., ls -la).
     base_command_for_context: The base command to use for context (e.g., "ls").
     command_context: The additional context (which, help, man)
     """
-    if not command_text.strip(): 
+    if not command_text.strip():
         return None
-    
-    context_data = command_context or {} 
 
-    prompt = PROMPT_TEMPLATES["generate_description"].format(
+    context_data = command_context or {}
+
+    # Duplicates dominate shell histories, and re-indexing revisits every
+    # command: key the cache on the command plus its context so a repeat is
+    # one local SELECT instead of an LLM round-trip. The context is part of
+    # the key because a changed --help/man output should refresh the text.
+    cache_key = hashlib.sha1(
+        "\x1f".join((
+            command_text,
+            context_data.get("which_info") or "N/A",
+            context_data.get("help_info") or "N/A",
+            context_data.get("man_info") or "N/A",
+        )).encode("utf-8", errors="ignore")
+    ).hexdigest()
+    cached = llm_cache.get("generate_description", cache_key)
+    if cached is not None:
+        return cached
+
+    prompt = _COMPILED_PROMPTS["generate_description"](
         command_text=command_text,
         base_command=base_command_for_context, 
         which_info=context_data.get("which_info", "N/A"),
         help_info=context_data.get("help_info", "N/A"),
         man_info=context_data.get("man_info", "N/A")
     )
-    description = _call_llm_api(prompt, max_tokens=1024, temperature=0.1) 
+    # Stream and hang up at the first sentence boundary: the server stops
+    # generating instead of filling the whole 1024-token budget.
+    description = _call_llm_api(prompt, max_tokens=1024, temperature=0.1, stop_on_sentence=True)
+    if description:
+        llm_cache.put("generate_description", cache_key, description)
     return description
 
+def generate_descriptions_batch(
+    commands: List[str],
+    contexts: Optional[List[Optional[Dict[str, Optional[str]]]]] = None,
+    max_concurrency: Optional[int] = None
+) -> List[Optional[str]]:
+    """
+    Generate English descriptions for many commands at once, keeping up to
+    max_concurrency LLM requests in flight (network-bound, so threads overlap
+    the round-trips; defaults to config.LLM_MAX_CONCURRENT_REQUESTS).
+    Returns descriptions in the same order as `commands`; failed entries are None.
+    """
+    if not commands:
+        return []
+    if contexts is None:
+        contexts = [None] * len(commands)
+    if max_concurrency is None:
+        max_concurrency = config.LLM_MAX_CONCURRENT_REQUESTS
+    results: List[Optional[str]] = [None] * len(commands)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        future_to_index = {
+            executor.submit(
+                generate_description,
+                command,
+                base_command_for_context=(utils.get_base_command(command) or command),
+                command_context=context
+            ): i
+            for i, (command, context) in enumerate(zip(commands, contexts))
+        }
+        for future in concurrent.futures.as_completed(future_to_index):
+            try:
+                results[future_to_index[future]] = future.result()
+            except Exception as e:
+                print(f"Error generating description in batch: {e}")
+    return results
+
 def generate_command_from_description(description_text: str) -> Optional[str]:
     """Use LLM to generate a Shell command based on an **English** command description."""
     if not description_text.strip(): return None
-    prompt = PROMPT_TEMPLATES["generate_command_from_description"].format(description_text=description_text)
+    prompt = _COMPILED_PROMPTS["generate_command_from_description"](description_text=description_text)
     command = _call_llm_api(prompt, max_tokens=100, temperature=0.3)
     if command: 
         command = command.strip()
@@ -177,12 +366,41 @@ def generate_command_from_description(description_text: str) -> Optional[str]:
             command = "\n".join(cmd_line.strip() for cmd_line in lines).strip()
     return command if command and command.strip() else None
 
+# In-memory layer in front of the disk cache for the small, hot sets of
+# inputs these helpers see within one process (the same query re-typed, the
+# same locale pair). Only successes are stored — functools.lru_cache would
+# also pin failed LLM calls for the process lifetime. Crude size cap instead
+# of LRU bookkeeping; these never grow past a handful of entries in practice.
+_MEMO_MAX_ENTRIES = 2048
+_ENHANCE_MEMO: Dict[str, str] = {}
+_TRANSLATE_MEMO: Dict[str, str] = {}
+
+def _memo_put(memo: Dict[str, str], key: str, value: str) -> None:
+    if len(memo) >= _MEMO_MAX_ENTRIES:
+        memo.clear()
+    memo[key] = value
+
 def enhance_query_for_sparse_search(english_user_query: str) -> Optional[str]:
-    """Use LLM to enhance an **English** user query to optimize sparse retrieval."""
+    """
+    Use LLM to enhance an **English** user query to optimize sparse retrieval.
+    Results are cached in memory and on disk keyed by the query, so repeated
+    searches skip the network round-trip.
+    """
     if not english_user_query.strip(): return english_user_query
-    prompt = PROMPT_TEMPLATES["enhance_query_for_sparse_search"].format(user_query=english_user_query)
+    memoized = _ENHANCE_MEMO.get(english_user_query)
+    if memoized is not None:
+        return memoized
+    cached = llm_cache.get("enhance_query_for_sparse_search", english_user_query)
+    if cached is not None:
+        _memo_put(_ENHANCE_MEMO, english_user_query, cached)
+        return cached
+    prompt = _COMPILED_PROMPTS["enhance_query_for_sparse_search"](user_query=english_user_query)
     enhanced_query = _call_llm_api(prompt, max_tokens=100, temperature=0.3, is_json_output=False)
-    return enhanced_query if enhanced_query and enhanced_query.strip() else english_user_query
+    if enhanced_query and enhanced_query.strip():
+        llm_cache.put("enhance_query_for_sparse_search", english_user_query, enhanced_query)
+        _memo_put(_ENHANCE_MEMO, english_user_query, enhanced_query)
+        return enhanced_query
+    return english_user_query
 
 
 def translate_text(
@@ -190,20 +408,35 @@ def translate_text(
     target_language: str, 
     source_language: Optional[str] = "auto"
 ) -> Optional[str]:
-    """Use LLM to translate text from source language to target language."""
+    """
+    Use LLM to translate text from source language to target language.
+    Translations are cached in memory and on disk keyed by (languages, text).
+    """
     if not text_to_translate.strip(): return ""
+    cache_key = f"{source_language}->{target_language}:{text_to_translate}"
+    memoized = _TRANSLATE_MEMO.get(cache_key)
+    if memoized is not None:
+        return memoized
+    cached = llm_cache.get("translate_text", cache_key)
+    if cached is not None:
+        _memo_put(_TRANSLATE_MEMO, cache_key, cached)
+        return cached
     source_lang_display = source_language
     if source_language == "auto": 
         if target_language.lower().startswith("en"): source_lang_display = "source language (e.g., Chinese)"
         elif target_language.lower().startswith("zh") or "chinese" in target_language.lower() or "中文" in target_language:
              source_lang_display = "source language (e.g., English)"
-    prompt = PROMPT_TEMPLATES["translate_text"].format(
+    prompt = _COMPILED_PROMPTS["translate_text"](
         text_to_translate=text_to_translate,
         source_language=source_lang_display,
         target_language=target_language
     )
     max_trans_tokens = max(100, int(len(text_to_translate) * 2.5) + 50)
-    return _call_llm_api(prompt, max_tokens=max_trans_tokens, temperature=0.05)
+    translated = _call_llm_api(prompt, max_tokens=max_trans_tokens, temperature=0.05)
+    if translated:
+        llm_cache.put("translate_text", cache_key, translated)
+        _memo_put(_TRANSLATE_MEMO, cache_key, translated)
+    return translated
 
 def generate_command_via_rag(english_user_query: str, retrieved_entries: List[models.CommandEntry]) -> Optional[str]:
     """
@@ -220,7 +453,7 @@ def generate_command_via_rag(english_user_query: str, retrieved_entries: List[mo
             f"  LLM-Generated Command from Description (English): `{entry.processed_command or 'N/A'}`\n"
         )
     retrieved_context_str = "\n".join(context_parts) if context_parts else "No relevant history commands found for reference."
-    prompt = PROMPT_TEMPLATES["generate_command_rag"].format(
+    prompt = _COMPILED_PROMPTS["generate_command_rag"](
         user_query=english_user_query, retrieved_context_str=retrieved_context_str
     )
     return _call_llm_api(prompt, max_tokens=250, temperature=0.4)
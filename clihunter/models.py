@@ -9,7 +9,7 @@ class CommandEntry(BaseModel):
     Represents a command record stored in the database.
     (MVP version, embedding-related fields removed)
     """
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=lambda: uuid.uuid4().hex)
     
     raw_command: str = Field(..., description="Original command read from history or manually added by user")
     
@@ -1,4 +1,6 @@
 # clihunter/search/dense_search.py
+import numpy as np
+from numpy.random import Generator, PCG64
 from typing import List, Optional, TYPE_CHECKING
 # from sentence_transformers import SentenceTransformer # 实际使用时会取消注释
 # 使用 TYPE_CHECKING 来避免循环导入，因为 models 可能会导入 search 中的某些类型 (虽然目前没有)
@@ -7,6 +9,10 @@ if TYPE_CHECKING:
 
 from .. import config # 用于获取模型名称等配置
 
+# 常见的 embedding 维度有 384 (all-MiniLM-L6-v2), 768 (很多 MBERT-style 模型), 1024 (如 mxbai-embed-large)
+# 我们用768作为示例
+DUMMY_EMBEDDING_DIM = 768
+
 # 全局变量来缓存模型，避免重复加载
 # _embedding_model = None # 实际使用时会取消注释
 
@@ -28,10 +34,11 @@ from .. import config # 用于获取模型名称等配置
 # return _embedding_model
 
 
-def generate_embedding(text: str) -> Optional[List[float]]:
+def generate_embedding(text: str) -> Optional[np.ndarray]:
     """
     为给定的文本生成向量 embedding。
     这是一个占位符实现。实际应用中会调用真正的模型。
+    返回 float32 ndarray；需要 List[float] 的调用方自行 .tolist()。
     """
     if not text or not text.strip():
         return None
@@ -57,18 +64,79 @@ def generate_embedding(text: str) -> Optional[List[float]]:
 
     # --- 占位符逻辑 ---
     # 返回一个固定维度的虚拟 embedding，以便流程能继续。
-    # 常见的 embedding 维度有 384 (all-MiniLM-L6-v2), 768 (很多 MBERT-style 模型), 1024 (如 mxbai-embed-large)
-    # 我们用768作为示例
-    dummy_dim = 768 
-    # 用文本长度和一个简单哈希生成伪随机向量，使其对不同输入有所不同
-    hash_val = hash(text)
-    return [( (hash_val + i * 13) % 10000 / 10000.0 ) - 0.5 for i in range(dummy_dim)]
-
-def search_vectors(query_vector: List[float], top_k: int) -> List['models.CommandEntry']:
+    # 用文本哈希播种 PCG64，一次 C 级缓冲区填充代替 768 次 Python 迭代；
+    # float32 连续数组正是 Faiss 之类的下游索引所期望的布局。
+    rng = Generator(PCG64(hash(text) & ((1 << 64) - 1)))
+    return rng.random(DUMMY_EMBEDDING_DIM, dtype=np.float32) - np.float32(0.5)
+
+
+def generate_embeddings(texts: List[str]) -> np.ndarray:
     """
-    (占位符) 在向量数据库中搜索与查询向量最相似的 top_k 个向量。
-    实际应用中，这里会与向量索引 (FAISS, ChromaDB等) 或数据库的向量搜索功能交互。
+    批量生成 embeddings，返回 (N, D) float32 数组。
+    真实后端应整批调用模型，在一次前向里摊销 tokenizer/padding 成本：
+    # _embedding_model.encode(texts, batch_size=1024, convert_to_numpy=True,
+    #                         normalize_embeddings=True, show_progress_bar=False)
+    占位符实现逐行填充同一个预分配数组；空文本行置零。
     """
-    print(f"INFO: (占位符) 正在使用维度为 {len(query_vector)} 的查询向量进行向量搜索, top_k={top_k}")
-    # 返回一个空列表作为占位符
-    return []
\ No newline at end of file
+    out = np.zeros((len(texts), DUMMY_EMBEDDING_DIM), dtype=np.float32)
+    for i, text in enumerate(texts):
+        vector = generate_embedding(text)
+        if vector is not None:
+            out[i] = vector
+    return out
+
+# 内存向量索引：int8 码本 (N, D) + 每行一个还原尺度，外加对应的 command id。
+# int8 存储把内存流量压到 fp32 的 1/4——穷举打分是带宽受限的，这直接换成
+# 墙钟时间；逐向量的 max-abs 尺度让量化误差对内积排序几乎无影响。
+# 规模大到穷举扫描不够用时，换成 Faiss 即可保持同样的批量接口：
+#   index = faiss.index_factory(dim, "IVF4096,PQ32", faiss.METRIC_INNER_PRODUCT)
+#   index.train(vectors); index.add(vectors); index.nprobe = 16
+#   D, I = index.search(queries, top_k)
+_INDEX_CODES: Optional[np.ndarray] = None   # int8, (N, D)
+_INDEX_SCALES: Optional[np.ndarray] = None  # float32, (N,)
+_INDEX_IDS: List[str] = []
+
+
+def _quantize_int8(vectors: np.ndarray):
+    """逐向量 max-abs 量化到 int8，返回 (codes, scales)。全零行尺度记 1。"""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=-1) / 127.0
+    scales = np.where(scales == 0.0, 1.0, scales).astype(np.float32)
+    codes = np.round(vectors / scales[..., np.newaxis]).astype(np.int8)
+    return codes, scales
+
+
+def build_index(vectors: np.ndarray, ids: List[str]) -> None:
+    """用已计算的 embeddings 重建内存索引。vectors 为 (N, D)，ids 对齐每行。"""
+    global _INDEX_CODES, _INDEX_SCALES, _INDEX_IDS
+    _INDEX_CODES, _INDEX_SCALES = _quantize_int8(vectors)
+    _INDEX_IDS = list(ids)
+
+
+def search_vectors(query_vectors: 'np.ndarray', top_k: int) -> List[List[tuple]]:
+    """
+    批量向量搜索：query_vectors 为 (Q, D)（单条 (D,) 也接受），查询同样量化到
+    int8，int32 累加内积后乘回两端尺度。返回每条查询的
+    [(command_id, score), ...] 列表，分数降序——与 database.search_commands_fts
+    的 (id, score) 形状一致，由上层负责取回 CommandEntry。
+    """
+    if _INDEX_CODES is None or not len(_INDEX_IDS):
+        return []
+    queries = np.asarray(query_vectors, dtype=np.float32)
+    if queries.ndim == 1:
+        queries = queries[np.newaxis, :]
+    q_codes, q_scales = _quantize_int8(queries)
+
+    # einsum 逐元素在 int32 里累加，避免先把整个码本提升成 int32 的拷贝
+    raw = np.einsum('nd,qd->qn', _INDEX_CODES, q_codes.astype(np.int32))
+    scores = raw.astype(np.float32) * _INDEX_SCALES[np.newaxis, :] * q_scales[:, np.newaxis]
+
+    k = min(top_k, scores.shape[1])
+    # argpartition 取无序 top-k (O(N))，再只对 k 个元素排序
+    top_unsorted = np.argpartition(scores, -k, axis=1)[:, -k:]
+
+    results: List[List[tuple]] = []
+    for row, candidates in enumerate(top_unsorted):
+        ordered = candidates[np.argsort(scores[row, candidates])[::-1]]
+        results.append([(_INDEX_IDS[i], float(scores[row, i])) for i in ordered])
+    return results
\ No newline at end of file
@@ -0,0 +1,94 @@
+# clihunter/search/embedding_cache.py
+import hashlib
+import sqlite3
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+from .. import config
+
+# SQLite-backed cache of computed embeddings, keyed by (model name, sha256 of
+# the text). A hit skips the whole model forward pass, which dominates
+# indexing time on duplicate-heavy corpora; vectors are stored as float16
+# blobs (half the bytes of fp32, negligible cosine error). Keying on the
+# model name means switching models starts a fresh namespace instead of
+# serving vectors from the wrong model. Lives next to llm_cache.db.
+CACHE_DB_PATH = config.APP_STATE_DIR / "embedding_cache.db"
+
+# In-process tier in front of the disk store, same shape as the memo dicts
+# in llm_handler: successes only, crude size cap instead of LRU bookkeeping.
+_MEMO_MAX_ENTRIES = 4096
+_MEMO: Dict[Tuple[str, bytes], np.ndarray] = {}
+
+
+def _get_cache_connection() -> sqlite3.Connection:
+    conn = sqlite3.connect(str(CACHE_DB_PATH))
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS embedding_cache (
+            model_name TEXT NOT NULL,
+            text_sha256 BLOB NOT NULL,
+            embedding BLOB NOT NULL,
+            created_timestamp INTEGER DEFAULT (STRFTIME('%s', 'now')),
+            PRIMARY KEY (model_name, text_sha256)
+        )
+    """)
+    return conn
+
+
+def get_or_compute(
+    text: str,
+    compute_fn: Callable[[str], Optional[np.ndarray]],
+    model_name: Optional[str] = None
+) -> Optional[np.ndarray]:
+    """
+    Return the cached embedding for (model_name, text), computing and storing
+    it via compute_fn on a miss. Returns float32; compute_fn failures (None)
+    are passed through uncached so they are retried next time.
+    """
+    if model_name is None:
+        model_name = config.SENTENCE_TRANSFORMER_MODEL
+    key = (model_name, hashlib.sha256(text.encode("utf-8")).digest())
+
+    memoized = _MEMO.get(key)
+    if memoized is not None:
+        return memoized
+
+    try:
+        with _get_cache_connection() as conn:
+            row = conn.execute(
+                "SELECT embedding FROM embedding_cache WHERE model_name = ? AND text_sha256 = ?",
+                key
+            ).fetchone()
+    except sqlite3.Error:
+        row = None  # A broken cache must never break the caller
+    if row is not None:
+        vector = np.frombuffer(row[0], dtype=np.float16).astype(np.float32)
+        _memo_put(key, vector)
+        return vector
+
+    vector = compute_fn(text)
+    if vector is None:
+        return None
+    vector = np.asarray(vector, dtype=np.float32)
+    try:
+        with _get_cache_connection() as conn:
+            conn.execute(
+                """
+                INSERT INTO embedding_cache (model_name, text_sha256, embedding)
+                VALUES (?, ?, ?)
+                ON CONFLICT(model_name, text_sha256) DO UPDATE SET
+                    embedding = excluded.embedding,
+                    created_timestamp = STRFTIME('%s', 'now')
+                """,
+                (key[0], key[1], vector.astype(np.float16).tobytes())
+            )
+    except sqlite3.Error:
+        pass
+    _memo_put(key, vector)
+    return vector
+
+
+def _memo_put(key: Tuple[str, bytes], vector: np.ndarray) -> None:
+    if len(_MEMO) >= _MEMO_MAX_ENTRIES:
+        _MEMO.clear()
+    _MEMO[key] = vector
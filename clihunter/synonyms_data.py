@@ -1,5 +1,7 @@
 import re
-from typing import List, Dict
+import sys
+import types
+from typing import Dict, List, Mapping, Tuple
 
 SYNONYM_GROUPS = [
     # --- useful similiar command ---
@@ -128,20 +130,29 @@ SYNONYM_GROUPS = [
     ["test", "testing", "unit test", "integration test"],
 ]
 
-_SYNONYM_LOOKUP_MAP = None # 保持这个查找map的逻辑不变
+def _build_synonym_lookup_map() -> Mapping[str, Tuple[str, ...]]:
+    lookup: Dict[str, Tuple[str, ...]] = {}
+    for group in SYNONYM_GROUPS:
+        # sys.intern collapses terms shared across groups ("get", "find", ...)
+        # to one string object; interned keys also let dict lookups
+        # short-circuit on pointer equality before comparing characters.
+        normalized_group = tuple(sorted(set(sys.intern(term.lower()) for term in group)))
+        for term in normalized_group:
+            lookup[term] = normalized_group
+    return types.MappingProxyType(lookup)
 
-def get_synonym_lookup_map() -> Dict[str, List[str]]:
+# SYNONYM_GROUPS is a literal constant, so the lookup map is built once at
+# import instead of behind a lazy None-check on every query. Tuples for the
+# groups and a read-only MappingProxyType view make it safe to share across
+# threads and free of per-call branching.
+_SYNONYM_LOOKUP_MAP: Mapping[str, Tuple[str, ...]] = _build_synonym_lookup_map()
+
+def get_synonym_lookup_map() -> Mapping[str, Tuple[str, ...]]:
     """
-    Convert SYNONYM_GROUPS into a lookup dictionary for fast retrieval of synonyms (including itself).
-    Key is each term in the group, and value is the complete synonym group it belongs to.
+    Lookup dictionary built from SYNONYM_GROUPS for fast retrieval of synonyms
+    (including itself). Key is each term in the group, and value is the
+    complete synonym group it belongs to. Read-only; precomputed at import.
     """
-    global _SYNONYM_LOOKUP_MAP
-    if _SYNONYM_LOOKUP_MAP is None:
-        _SYNONYM_LOOKUP_MAP = {}
-        for group in SYNONYM_GROUPS:
-            normalized_group = sorted(list(set(term.lower() for term in group)))
-            for term in normalized_group:
-                _SYNONYM_LOOKUP_MAP[term] = normalized_group
     return _SYNONYM_LOOKUP_MAP
 
 if __name__ == "__main__":
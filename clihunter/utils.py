@@ -1,164 +1,353 @@
-# clihunter/shell_utils.py
+# clihunter/utils.py
+import functools
+import json
+import os
+import re
+import select
+import shutil
+import signal
 import subprocess
-import shlex 
-from typing import Dict, Optional, List, Set
+import shlex
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, List, Set, Tuple
+
+from . import config
+from . import llm_cache
+from .synonyms_data import get_synonym_lookup_map
 
 # Restrict the number of lines or tokens from "--help" or "man"
 # This is to avoid overwhelming the user with too much information.
 MAX_CONTEXT_LINES = 30
-MAX_CONTEXT_CHARS = 1500 
+MAX_CONTEXT_CHARS = 1500
+
+# Help-looking stderr detection: one case-insensitive C-level scan over the
+# original text instead of lowering the whole output and running three
+# separate `in` searches.
+_STDERR_HELP_RE = re.compile(r'usage:|help|option', re.I)
 
-def _run_shell_command(cmd_parts: List[str], timeout: int = 3) -> Optional[str]:
+_HELP_FLAGS = ("--help", "-h", "help")
+
+def _kill_process_group(process: "subprocess.Popen") -> None:
+    """
+    Kill a process started with start_new_session=True together with all its
+    children (man forks groff/nroff grandchildren that a plain terminate()
+    would orphan, leaving them burning CPU after a timeout).
+    """
+    try:
+        os.killpg(os.getpgid(process.pid), signal.SIGKILL)
+    except (ProcessLookupError, PermissionError, OSError):
+        process.kill()
+    try:
+        process.wait(timeout=1)
+    except Exception:
+        pass
+
+
+def _run_shell_command(cmd_parts: List[str], timeout: int = 3) -> Tuple[int, Optional[str]]:
     """
     run a shell command and capture its stdout and stderr.
     Prefer stdout, if empty and command has error (usually help info will print to stderr), return stderr.
     :param cmd_parts: List of command parts to be executed.
     :param timeout: Timeout for the command execution in seconds.
-    :return: The output of the command or None if no output.
+    :return: (returncode, output) — output is None if the command produced
+        nothing usable; returncode is -1 when the command never ran
+        (timeout, missing binary), with the error message as output.
     """
     try:
-        process = subprocess.run(
+        # Popen instead of subprocess.run so we own the pid: on timeout the
+        # whole session (the command plus anything it forked) is killed,
+        # not just the direct child.
+        process = subprocess.Popen(
             cmd_parts,
-            capture_output=True,
-            text=True,        
-            timeout=timeout,  
-            check=False,      
-            errors='replace'  
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            errors='replace',
+            start_new_session=True
         )
-        
+        try:
+            stdout, stderr = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            _kill_process_group(process)
+            return -1, f"Error: Command '{' '.join(cmd_parts)}' timeout ({timeout} seconds)."
+
         output = ""
-        if process.stdout and process.stdout.strip():
-            output = process.stdout.strip()
-        elif process.stderr and process.stderr.strip():
-            stderr_lower = process.stderr.lower()
-            if "usage:" in stderr_lower or "help" in stderr_lower or "option" in stderr_lower or process.returncode != 0:
-                output = process.stderr.strip()
-        
+        if stdout and stdout.strip():
+            output = stdout.strip()
+        elif stderr and stderr.strip():
+            if process.returncode != 0 or _STDERR_HELP_RE.search(stderr):
+                output = stderr.strip()
+
         if not output:
-            return None
+            return process.returncode, None
 
-        lines = output.splitlines()
-        if len(lines) > MAX_CONTEXT_LINES:
-            output = "\n".join(lines[:MAX_CONTEXT_LINES]) + f"\n... (Content has been truncated, total num of lines: {len(lines)})"
-        
-        if len(output) > MAX_CONTEXT_CHARS:
-            output = output[:MAX_CONTEXT_CHARS] + "... (Content has been truncated)"
-            
-        return output
+        return process.returncode, _truncate_output(output)
 
-    except subprocess.TimeoutExpired:
-        return f"Error: Command '{' '.join(cmd_parts)}' timeout ({timeout} seconds)."
-    except FileNotFoundError: 
-        return f"Error: Command '{cmd_parts[0]}' not found."
+    except FileNotFoundError:
+        return -1, f"Error: Command '{cmd_parts[0]}' not found."
     except Exception as e:
-        return f"Error: An unexpected error occurred while executing '{' '.join(cmd_parts)}': {e}"
+        return -1, f"Error: An unexpected error occurred while executing '{' '.join(cmd_parts)}': {e}"
+
+
+def _truncate_output(output: str) -> str:
+    """
+    Apply the line and char budgets without materializing a list of every
+    line. The char budget is checked first with a plain slice, and newlines
+    inside the budget are counted with str.count (one C-level scan), so a
+    megabyte man page never gets splitlines+join'd in full — at most the
+    1500-char head is split.
+    """
+    if len(output) > MAX_CONTEXT_CHARS:
+        if output.count('\n', 0, MAX_CONTEXT_CHARS) >= MAX_CONTEXT_LINES:
+            # Line cap hits inside the char budget; split only the head.
+            lines = output[:MAX_CONTEXT_CHARS].splitlines()
+            total_lines = output.count('\n') + 1
+            return "\n".join(lines[:MAX_CONTEXT_LINES]) + f"\n... (Content has been truncated, total num of lines: {total_lines})"
+        return output[:MAX_CONTEXT_CHARS] + "... (Content has been truncated)"
+
+    lines = output.splitlines()
+    if len(lines) > MAX_CONTEXT_LINES:
+        return "\n".join(lines[:MAX_CONTEXT_LINES]) + f"\n... (Content has been truncated, total num of lines: {len(lines)})"
+    return output
 
 def get_base_command(raw_command_text: str) -> Optional[str]:
     """
     get the base command from a raw command text.
     e.g. get 'ls' from 'ls -l --color=auto'
+    This runs on every history line, so the common unquoted case uses a plain
+    str.split instead of building a shlex tokenizer (a per-character Python
+    state machine); shlex only kicks in when quotes or backslashes are
+    present and token boundaries actually depend on them.
     """
-    try:
-        parts = shlex.split(raw_command_text)
-        if not parts:
+    if not raw_command_text:
+        return None
+
+    if '"' in raw_command_text or "'" in raw_command_text or '\\' in raw_command_text:
+        try:
+            parts = shlex.split(raw_command_text)
+        except ValueError:
+            return raw_command_text.split(' ')[0] if raw_command_text else None
+        except Exception:
             return None
-        
-        for part in parts:
-            if '=' not in part:
-                if part.startswith('-') and part != parts[0]: 
-                    continue 
-                if part == "sudo":
-                    continue
-                return part 
-        
-        return parts[0] if parts else None
+    else:
+        parts = raw_command_text.split()
 
-    except ValueError: 
-        return raw_command_text.split(' ')[0] if raw_command_text else None
-    except Exception: 
+    if not parts:
         return None
 
+    for part in parts:
+        if '=' not in part:
+            if part.startswith('-') and part != parts[0]:
+                continue
+            if part == "sudo":
+                continue
+            return part
 
-def get_command_context(raw_command_text: str) -> Dict[str, Optional[str]]:
+    return parts[0]
+
+
+def is_excluded_prefix(raw_command_text: str) -> bool:
     """
-    get some context from (which, --help, man)。
+    Test whether a raw command starts with an excluded base command by walking
+    config.EXCLUSION_TRIE character by character. Leading 'sudo' and VAR=value
+    assignments are skipped (same as get_base_command), but no base-command
+    substring is ever allocated on the hot path.
     """
-    context = {
-        "which_info": "N/A", # Not Applicable / Not Available
-        "help_info": "N/A",
-        "man_info": "N/A",
-    }
-    base_command = get_base_command(raw_command_text)
+    if not raw_command_text:
+        return False
+    text = raw_command_text.lstrip()
+    # Common case first: the command starts directly with an excluded word.
+    # startswith with a tuple runs entirely in C; the trie walk below only
+    # handles the rarer sudo / VAR=value prefixes.
+    if text.startswith(config.DEFAULT_COMMAND_EXCLUSION_PREFIXES) or \
+       text in config.DEFAULT_COMMAND_EXCLUSION_SET:
+        return True
+    n = len(text)
+    i = 0
+    # Skip over sudo / environment-assignment prefix tokens.
+    while i < n:
+        j = text.find(' ', i)
+        end = n if j == -1 else j
+        token = text[i:end]
+        if token == "sudo" or '=' in token:
+            if j == -1:
+                return False
+            i = j + 1
+            while i < n and text[i] == ' ':
+                i += 1
+            continue
+        break
 
-    if not base_command:
-        return context
+    node = config.EXCLUSION_TRIE
+    trie_end = config.EXCLUSION_TRIE_END
+    while i < n:
+        ch = text[i]
+        if ch == ' ':
+            break
+        node = node.get(ch)
+        if node is None:
+            return False
+        i += 1
+    # Excluded only if the walk consumed a complete excluded word up to a
+    # word boundary (space or end of string).
+    return trie_end in node
 
-    # 1. which <base_command>
-    which_info = _run_shell_command(["which", base_command], timeout=1)
-    if f"no {base_command} in" in which_info.lower():
-        context["which_info"] = "N/A"
-    else:
-        context["which_info"] = which_info
-
-    # 2. <base_command> --help
-    help_flags_tried = ["--help", "-h", "help"] 
-    for flag in help_flags_tried:
-        cmd_to_run = [base_command, flag] if flag == "help" and base_command not in ["help"] else [base_command, flag]
-        if base_command == "help" and flag == "help": 
-            cmd_to_run = [base_command, "--help"] 
-
-        help_output = _run_shell_command(cmd_to_run)
-        if help_output and "error" not in help_output.lower() and \
-           "invalid option" not in help_output.lower() and \
-           "unknown command" not in help_output.lower() and \
-           "not found" not in help_output.lower() and \
-           len(help_output) > 20: 
-            context["help_info"] = help_output
-            break 
-
-    # 3. man <base_command> | col -bx (col -bx to clean up the output)
+
+# Context is entirely a function of the base command, so cache it per base
+# command: history imports see the same few dozen bases over and over, and a
+# hit skips three subprocess spawns (which / --help / man).
+# One executor for the whole process: the which / --help / man probes are
+# IO-bound forks that release the GIL in communicate(), so running them
+# concurrently collapses the sequential subprocess waits into ~one.
+_CONTEXT_EXECUTOR = ThreadPoolExecutor(max_workers=5, thread_name_prefix="cmd-context")
+
+# One C-level scan for all four rejection markers instead of four lowered
+# `in` searches over the (potentially 1500-char) help output.
+_HELP_REJECT_RE = re.compile(r'\b(error|invalid option|unknown command|not found)\b', re.I)
+
+
+def _fetch_help_info(base_command: str) -> Optional[str]:
+    """
+    Probe the help flags in order and return the first plausible output.
+    Probing stops at the first hit — for most commands that is --help, so
+    the -h / help forks (2 extra fork+execs) never happen.
+    """
+    for flag in _HELP_FLAGS:
+        cmd_to_run = [base_command, flag]
+        if base_command == "help" and flag == "help":
+            cmd_to_run = [base_command, "--help"]
+
+        _rc, help_output = _run_shell_command(cmd_to_run)
+        if help_output and len(help_output) > 20 and \
+           not _HELP_REJECT_RE.search(help_output):
+            return help_output
+    return "N/A"
+
+
+def _fetch_man_info(base_command: str) -> Optional[str]:
+    """Run man <base_command> | col -bx (col -bx to clean up the output)."""
     try:
         man_cmd = ["man", base_command]
-        man_process = subprocess.Popen(man_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        
-        col_process = subprocess.Popen(["col", "-bx"], stdin=man_process.stdout, 
-                                       stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        man_process.stdout.close() 
-
-        stdout_bytes, stderr_bytes = col_process.communicate(timeout=3) 
-        man_output_cleaned = stdout_bytes.decode(errors='replace').strip()
-
-        if col_process.returncode == 0 and man_output_cleaned:
-            lines = man_output_cleaned.splitlines()
-            if len(lines) > MAX_CONTEXT_LINES:
-                man_output_cleaned = "\n".join(lines[:MAX_CONTEXT_LINES]) + f"\n... (Content has been truncated, total number of lines: {len(lines)})"
-            if len(man_output_cleaned) > MAX_CONTEXT_CHARS:
-                man_output_cleaned = man_output_cleaned[:MAX_CONTEXT_CHARS] + "... (Content has been truncated)"
-            context["man_info"] = man_output_cleaned if man_output_cleaned.strip() else "N/A"
-        else:
-            # err_msg = stderr_bytes.decode(errors='replace').strip()
-            # context["man_info"] = f"Man page not found or error processing: {err_msg[:100]}" if err_msg else "Man page not found or error."
-            context["man_info"] = "N/A"
+        man_process = subprocess.Popen(man_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                       start_new_session=True)
 
+        col_process = subprocess.Popen(["col", "-bx"], stdin=man_process.stdout,
+                                       stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                       start_new_session=True)
+        man_process.stdout.close()
+
+        # Stream the pipe in 4KB chunks and stop as soon as the char budget
+        # (plus slack for the decode/strip) is covered. groff only formats
+        # what the pipeline consumes, so cutting the read here cuts the CPU
+        # spent formatting a 500KB page like bash(1), not just our decode.
+        deadline = time.monotonic() + 3
+        fd = col_process.stdout.fileno()
+        chunks = []
+        buffered = 0
+        budget = MAX_CONTEXT_CHARS * 2
+        while buffered < budget:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if not ready:
+                break
+            chunk = os.read(fd, 4096)
+            if not chunk:
+                break  # EOF: the whole page fit under the budget
+            chunks.append(chunk)
+            buffered += len(chunk)
+        # Kill both session groups: man's group includes the groff/nroff
+        # grandchildren that a plain terminate() on man itself would orphan.
+        _kill_process_group(col_process)
+        _kill_process_group(man_process)
+
+        man_output_cleaned = b"".join(chunks).decode(errors='replace').strip()
+        if man_output_cleaned:
+            man_output_cleaned = _truncate_output(man_output_cleaned)
+            return man_output_cleaned if man_output_cleaned.strip() else "N/A"
+        return "N/A"
 
     except FileNotFoundError:  # 'man' or 'col' command doesn't exist
-        context["man_info"] = "Error: 'man' or 'col' command not found in PATH."
+        return "Error: 'man' or 'col' command not found in PATH."
     except subprocess.TimeoutExpired:
-        context["man_info"] = f"Error: Timeout while fetching man page for '{base_command}'."
+        return f"Error: Timeout while fetching man page for '{base_command}'."
     except Exception as e:  # Other pipeline or subprocess errors
-        context["man_info"] = f"Error: Unexpected error occurred while processing man page for '{base_command}': {e}"
-        
+        return f"Error: Unexpected error occurred while processing man page for '{base_command}': {e}"
+
+
+# Context is entirely a function of the base command; lru_cache gives the
+# per-base memoization a bound (1024 bases ≫ any realistic history) without
+# hand-rolled eviction. Callers get a copy so cache entries stay pristine.
+@functools.lru_cache(maxsize=1024)
+def _get_command_context_cached(base_command: str) -> Dict[str, Optional[str]]:
+    context = {
+        "which_info": "N/A", # Not Applicable / Not Available
+        "help_info": "N/A",
+        "man_info": "N/A",
+    }
+
+    # Disk tier under the lru_cache: which/help/man output only changes when
+    # the binary does, so the context is keyed by (base, executable mtime)
+    # and survives across runs — repeated clihunter invocations skip the
+    # whole subprocess cascade. Reuses the llm_cache store and its TTL; a
+    # changed/updated binary changes the key and falls through to a re-probe.
+    exe_path = shutil.which(base_command)
+    mtime_ns = 0
+    if exe_path:
+        try:
+            mtime_ns = os.stat(exe_path).st_mtime_ns
+        except OSError:
+            pass
+    disk_key = f"{base_command}|{mtime_ns}"
+    cached = llm_cache.get("command_context", disk_key)
+    if cached is not None:
+        try:
+            return json.loads(cached)
+        except ValueError:
+            pass  # Corrupt entry: re-probe and overwrite below
+
+    # Launch the short-circuiting help probe and the man pipeline
+    # concurrently, then collect.
+    help_future = _CONTEXT_EXECUTOR.submit(_fetch_help_info, base_command)
+    man_future = _CONTEXT_EXECUTOR.submit(_fetch_man_info, base_command)
+
+    # 1. which — shutil.which above already walked PATH in-process, which is
+    # exactly what the which(1) fork+exec did, minus the fork.
+    context["which_info"] = exe_path or "N/A"
+
+    # 2. <base_command> --help / -h / help
+    context["help_info"] = help_future.result()
+
+    # 3. man <base_command> | col -bx
+    context["man_info"] = man_future.result()
+
+    llm_cache.put("command_context", disk_key, json.dumps(context))
     return context
 
-def preprocess_and_expand_query(
+
+def get_command_context(raw_command_text: str) -> Dict[str, Optional[str]]:
+    """
+    get some context from (which, --help, man)。
+    Results are cached by base command for the lifetime of the process; the
+    subprocess probes run concurrently on _CONTEXT_EXECUTOR.
+    """
+    base_command = get_base_command(raw_command_text)
+    if not base_command:
+        return {
+            "which_info": "N/A",
+            "help_info": "N/A",
+            "man_info": "N/A",
+        }
+    return dict(_get_command_context_cached(base_command))
+
+def _expand_query(
     query_text: str,
     synonym_map: Dict[str, List[str]], # synonym_map 的值是包含该词自身的同义词列表
-    apply_prefix_to_all_terms: bool = False
+    apply_prefix_to_all_terms: bool
 ) -> str:
-    """
-    对查询文本进行预处理（小写、分词），使用同义词扩展，
-    并将所有独立处理后的词条（原始词+同义词，已应用前缀和短语引号）用 " OR " 连接。
-    """
     if not query_text or not query_text.strip():
         return ""
 
@@ -166,44 +355,54 @@ def preprocess_and_expand_query(
     if not original_terms:
         return ""
 
-    all_processed_terms_for_or: Set[str] = set() # 使用集合来确保最终OR连接的词条是唯一的
-
-    for term in original_terms:
-        # 获取该词及其所有同义词（synonym_map 中的词和列表应该已经是小写）
-        # synonym_map.get(term, [term]) 确保即使词不在词典中，它自身也会被处理
-        term_and_its_synonyms_phrases = synonym_map.get(term, [term])
-
-        for s_term_phrase in term_and_its_synonyms_phrases:
-            # s_term_phrase 可能是一个单词，也可能是多词短语如 "list files"
-            
-            term_to_add = s_term_phrase # 默认情况下，同义词条直接使用
-
-            # 1. 如果是多词短语，FTS5 进行短语匹配时需要用双引号包裹
-            if " " in s_term_phrase.strip(): # 判断是否为多词短语
-                term_to_add = f'"{s_term_phrase}"'
-            
-            # 2. 应用前缀匹配 '*' 到处理后的词条 (单个词或带引号的短语)
-            if apply_prefix_to_all_terms:
-                # 确保只对有实际内容的词条加星号，并且避免重复加星号
-                # 对于短语 "some phrase"，前缀查询是 "some phrase*"
-                # 对于单词 word，前缀查询是 word*
-                is_phrase = term_to_add.startswith('"') and term_to_add.endswith('"')
-                actual_content = term_to_add[1:-1] if is_phrase else term_to_add # 获取引号内的内容或单词本身
-
-                if actual_content and not actual_content.endswith("*"):
-                    if is_phrase:
-                        term_to_add = f'"{actual_content}*"' # 例如 "list files*"
-                    else:
-                        term_to_add += "*" # 例如 word*
-            
-            all_processed_terms_for_or.add(term_to_add)
-    
-    if not all_processed_terms_for_or:
+    # 一次性把所有同义词组做 C 级 set.union，去重在 union 内部完成，
+    # 取代原来的 原始词 × 同义词 双层 Python 循环。
+    # intern 后与词典里同样 intern 过的键做指针相等比较，省掉逐字符比较
+    expanded: Set[str] = set().union(
+        *(synonym_map.get(sys.intern(term), (term,)) for term in original_terms)
+    )
+    if not expanded:
         return ""
-        
-    # 将所有唯一的、处理过的词条用 " OR " 连接
-    # 为了查询稳定性，可以对最终列表排序，但对于纯OR查询，顺序不影响逻辑结果
-    return " OR ".join(sorted(list(all_processed_terms_for_or)))
+
+    # 前缀开关在循环外只判断一次，选定一个格式化函数后整批 map：
+    # 多词短语 FTS5 短语匹配需要双引号包裹；前缀查询的星号放在引号内。
+    if apply_prefix_to_all_terms:
+        def _fmt(s: str) -> str:
+            if " " in s:
+                return f'"{s}*"'          # 例如 "list files*"
+            return s if s.endswith("*") else s + "*"  # 例如 word*
+    else:
+        def _fmt(s: str) -> str:
+            return f'"{s}"' if " " in s else s
+
+    # 将所有唯一的、处理过的词条用 " OR " 连接。
+    # 纯 OR 查询中 FTS5 不关心词序，排序只是外观上的稳定，
+    # 而缓存键用的是查询文本本身，因此省掉 O(K log K) 的排序和列表拷贝。
+    return " OR ".join(map(_fmt, expanded))
+
+
+# 交互式工具里同一查询会被反复提交（上下键翻历史、微调后重试）；
+# 展开结果是 (查询文本, 前缀开关) 的纯函数——词典是模块级只读单例——
+# 所以用 lru_cache 把整个 分词+并集+排序 换成一次字典命中。
+@functools.lru_cache(maxsize=2048)
+def _preprocess_and_expand_query_cached(query_text: str, apply_prefix_to_all_terms: bool) -> str:
+    return _expand_query(query_text, get_synonym_lookup_map(), apply_prefix_to_all_terms)
+
+
+def preprocess_and_expand_query(
+    query_text: str,
+    synonym_map: Dict[str, List[str]], # synonym_map 的值是包含该词自身的同义词列表
+    apply_prefix_to_all_terms: bool = False
+) -> str:
+    """
+    对查询文本进行预处理（小写、分词），使用同义词扩展，
+    并将所有独立处理后的词条（原始词+同义词，已应用前缀和短语引号）用 " OR " 连接。
+    传入全局同义词词典（所有调用方的现状）时结果走 lru_cache；
+    自定义词典（dict 不可哈希，无法做缓存键）退回直接计算。
+    """
+    if synonym_map is get_synonym_lookup_map():
+        return _preprocess_and_expand_query_cached(query_text, apply_prefix_to_all_terms)
+    return _expand_query(query_text, synonym_map, apply_prefix_to_all_terms)
 
 if __name__ == '__main__':
     print("--- Testing get_base_command ---")
@@ -224,5 +423,7 @@ if __name__ == '__main__':
         help_info_str = context.get('help_info', 'N/A') or 'N/A'
         man_info_str = context.get('man_info', 'N/A') or 'N/A'
         
-        print(f"  Help: {help_info_str[:200].replace('\n', ' ')}...") 
-        print(f"  Man: {man_info_str[:200].replace('\n', ' ')}...")
+        help_preview = help_info_str[:200].replace('\n', ' ')
+        man_preview = man_info_str[:200].replace('\n', ' ')
+        print(f"  Help: {help_preview}...")
+        print(f"  Man: {man_preview}...")
@@ -1,56 +1,176 @@
+import asyncio
+import functools
+import hashlib
+import itertools
+import json
+import logging
+import random
+import re
 import sqlite3
 import uuid
-import time
 import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 # from your_llm_module import get_llm_client # 你需要实现这个
 
 # --- 配置 ---
 DB_PATH = Path.home() / ".clihunter" / "commands.db"
-DEFAULT_EXCLUDE_COMMANDS = {'ls', 'cd', 'pwd', 'clear', 'exit', 'history'} # 简化版
+DEFAULT_EXCLUDE_COMMANDS = frozenset({'ls', 'cd', 'pwd', 'clear', 'exit', 'history'}) # 简化版
+# 排除匹配编译成一个锚定正则：单次 C 层扫描同时覆盖"首词是排除词"和
+# "整串就是排除词"两种情况，比每行 partition 出首词再查 frozenset 少一次
+# 字符串分配 + 哈希。从 DEFAULT_EXCLUDE_COMMANDS 生成，保持单一事实来源。
+_EXCLUDE_RE = re.compile(
+    r'^(?:%s)(?:\s|$)' % '|'.join(map(re.escape, sorted(DEFAULT_EXCLUDE_COMMANDS)))
+)
+
+# Path.home() 每次都要走 pwd/环境变量解析；进程内不会变，缓存一次。
+@functools.cache
+def _home():
+    return Path.home()
+
+# 默认 history 文件路径同样是进程级常量（HISTFILE 在进程启动后不变）。
+@functools.cache
+def _default_history_file(shell_type):
+    if shell_type == "bash":
+        return _home() / ".bash_history"
+    hist_file_env = os.getenv("HISTFILE")
+    return Path(hist_file_env) if hist_file_env else _home() / ".zsh_history"
 LLM_BATCH_SIZE = 10
+# 同时在途的 LLM 请求上限：限流交给 Semaphore，而不是批间 sleep
+LLM_MAX_CONCURRENCY = 8
+# Batch API 模式：首次导入是离线一次性任务，OpenAI Batch API 约五折、
+# 免逐请求限流，代价是最长 24h 的完成窗口。低于该条数直接走在线路径。
+BATCH_MIN_COMMANDS = 100
+BATCH_INPUT_PATH = DB_PATH.parent / "batch_input.jsonl"
+BATCH_STATE_PATH = DB_PATH.parent / "pending_batch.json"
+
+# 热循环里的逐条 print 每次都要拿 stdout 锁并 flush——万条命令就是几万次
+# 系统调用。逐条信息降级到 DEBUG 日志（默认关闭，零成本），用户反馈只留
+# 批边界上一行原地刷新的进度。
+log = logging.getLogger("clihunter.init")
 
 # --- 数据库操作 ---
 def get_db_connection():
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
     conn = sqlite3.connect(DB_PATH)
-    # 创建表 (如果还没创建)
-    # ... (执行上面的 CREATE TABLE 语句)
+    # 批量导入的经典瓶颈是每次 commit 一次 fsync（默认 journal_mode=DELETE、
+    # synchronous=FULL）；WAL + NORMAL 把一批写合并成顺序日志追加，
+    # temp_store=MEMORY 让临时结构不落盘。
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    # 规范形/出现记录两张表：同一条命令（空白折叠后相同）不管在多少个
+    # shell、多少份 history 里出现，description/processed 只存一份，
+    # LLM 也只为它付一次费；来源和时间戳散列到 command_occurrences，
+    # 多行指向共享的 commands 行。canonical 的 UNIQUE 是 INSERT OR IGNORE
+    # 去重的依据，没法推迟；二级索引见 create_indexes。
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS commands (
+            id INTEGER PRIMARY KEY,
+            canonical TEXT NOT NULL UNIQUE,
+            description TEXT,
+            processed TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS command_occurrences (
+            cmd_id INTEGER NOT NULL REFERENCES commands(id),
+            source TEXT NOT NULL,
+            history_timestamp INTEGER,
+            UNIQUE (cmd_id, source)
+        )
+    """)
+    return conn
+
+# 二级索引推迟到批量导入之后：建好索引再插 N 行，每行都要付一次
+# B-tree 维护；先裸表插完、最后一次性 CREATE INDEX 走排序式整体建树，
+# 快得多。IF NOT EXISTS 幂等，增量路径重复调用无副作用。
+# cmd_id 由 UNIQUE (cmd_id, source) 的左前缀覆盖，不再单独建索引。
+_SECONDARY_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_occurrences_source ON command_occurrences(source)",
+    "CREATE INDEX IF NOT EXISTS idx_occurrences_history_timestamp ON command_occurrences(history_timestamp)",
+)
+
+def create_indexes(conn):
+    for stmt in _SECONDARY_INDEXES:
+        conn.execute(stmt)
+    conn.commit()
+
+# LLM 结果按命令内容寻址缓存：shell history 里重复命令极多，
+# 重新导入时命中率接近 100%，命中即跳过整个（要花钱的）LLM 调用。
+# 单独一个数据库文件：SQLite 每个文件同时只允许一个写事务，放在主库里
+# 它的检查点 commit 会和跨越整个导入的主事务互相锁死。
+LLM_CACHE_DB_PATH = DB_PATH.parent / "llm_cache.db"
+
+def get_llm_cache_connection():
+    LLM_CACHE_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(LLM_CACHE_DB_PATH)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            cmd_hash BLOB PRIMARY KEY,
+            description TEXT,
+            processed TEXT
+        )
+    """)
     return conn
 
-def insert_command_batch(conn, commands_data):
-    # commands_data is a list of tuples:
-    # (id, raw_cmd, processed_cmd, desc, src, hist_ts)
+# SQL 文本经 lru_cache 固定为常量对象：sqlite3 的语句缓存按 SQL 文本
+# 查找，每批复用同一字符串保证命中。id 不再由 Python 生成：uuid4 的随机
+# 36 字符 TEXT 主键让 B-tree 插入完全乱序，INTEGER PRIMARY KEY 由 SQLite
+# 顺序分配 rowid，索引页只在尾部追加。需要稳定外部 id 时可换成时间有序
+# 的 uuid7。
+# executemany 仍然逐行 sqlite3_step；把多行折进一条 VALUES (...),(...),...
+# 的 INSERT 能进一步减少 VM 调用次数。行数受默认 999 个绑定参数上限约束。
+_MAX_BIND_PARAMS = 999
+
+_COMMANDS_INSERT_PREFIX = """
+    INSERT OR IGNORE INTO commands (canonical, description, processed)
+    VALUES """
+_OCCURRENCES_INSERT_PREFIX = """
+    INSERT OR IGNORE INTO command_occurrences (cmd_id, source, history_timestamp)
+    VALUES """
+
+@functools.lru_cache(maxsize=None)
+def _values_sql(insert_prefix, columns, n_rows):
+    placeholder = "(" + ", ".join(["?"] * columns) + ")"
+    return insert_prefix + ", ".join([placeholder] * n_rows)
+
+def _insert_many(cursor, insert_prefix, columns, rows):
+    # 注意：这里不再 commit——整个导入跑在一个事务里，由调用方统一提交，
+    # 把每批一次的 fsync 压缩成整个导入一次。cursor 由调用方创建一次、
+    # 跨批复用，避免每批重建游标。返回实际插入的行数。
     try:
-        cursor = conn.cursor()
-        cursor.executemany("""
-            INSERT OR IGNORE INTO saved_commands
-            (id, raw_command, processed_command, description, source, history_timestamp, added_timestamp)
-            VALUES (?, ?, ?, ?, ?, ?, STRFTIME('%s', 'now'))
-        """, commands_data)
-        conn.commit()
-        return cursor.rowcount # 返回实际插入的行数
+        rows_per_stmt = _MAX_BIND_PARAMS // columns
+        inserted = 0
+        for start in range(0, len(rows), rows_per_stmt):
+            chunk = rows[start:start + rows_per_stmt]
+            sql = _values_sql(insert_prefix, columns, len(chunk))
+            cursor.execute(sql, list(itertools.chain.from_iterable(chunk)))
+            inserted += cursor.rowcount
+        return inserted
     except sqlite3.Error as e:
         print(f"Database error: {e}")
         return 0
 
 # --- History 解析 ---
+# 生成器逐行产出，而不是先在内存里建完整 list：长寿 shell 的 history
+# 能到几百 MB，list + 去重 dict + items() 拷贝是三倍内存；
+# 流式消费后峰值内存只有 O(唯一命令数)。大缓冲减少大文件的 read 次数。
 def parse_bash_history(file_path):
-    commands = []
     try:
-        with open(file_path, 'r', errors='ignore') as f:
+        with open(file_path, 'r', errors='ignore', buffering=1 << 20) as f:
             for line in f:
                 cmd_text = line.strip()
                 if cmd_text: # 忽略空行
-                    commands.append({'text': cmd_text, 'timestamp': None}) # Bash history 默认不带时间戳
+                    yield {'text': cmd_text, 'timestamp': None} # Bash history 默认不带时间戳
     except FileNotFoundError:
         print(f"History file not found: {file_path}")
-    return commands
 
 def parse_zsh_history(file_path):
-    commands = []
     try:
-        with open(file_path, 'r', errors='ignore') as f:
+        with open(file_path, 'r', errors='ignore', buffering=1 << 20) as f:
             for line in f:
                 line = line.strip()
                 if not line:
@@ -65,103 +185,423 @@ def parse_zsh_history(file_path):
                     except (ValueError, IndexError):
                         pass #无法解析时间戳
                 if cmd_text:
-                    commands.append({'text': cmd_text, 'timestamp': timestamp})
+                    yield {'text': cmd_text, 'timestamp': timestamp}
     except FileNotFoundError:
         print(f"History file not found: {file_path}")
-    return commands
+
+# --- 内置描述表 ---
+# 高频命令的静态描述：命中即整条跳过 LLM（一次网络往返 + token 费用），
+# 也不占缓存。键是 (argv[0], argv[1])（子命令，如 git status）或
+# (argv[0],)；第二个词带 '-' 前缀（标志）时只按首词回落。实际表应覆盖
+# top ~200 命令，这里列代表性子集。
+BUILTIN_DESCRIPTIONS = {
+    ("git", "status"): "Show the git working tree status.",
+    ("git", "log"): "Show git commit history.",
+    ("git", "diff"): "Show changes between git commits or the working tree.",
+    ("git", "pull"): "Fetch and merge changes from a git remote.",
+    ("git", "push"): "Push local git commits to a remote.",
+    ("git", "add"): "Stage file changes for the next git commit.",
+    ("git", "commit"): "Record staged changes as a git commit.",
+    ("git", "checkout"): "Switch git branches or restore files.",
+    ("git", "branch"): "List, create, or delete git branches.",
+    ("git", "stash"): "Stash uncommitted git changes.",
+    ("docker", "ps"): "List running Docker containers.",
+    ("docker", "images"): "List local Docker images.",
+    ("docker", "build"): "Build a Docker image from a Dockerfile.",
+    ("docker", "run"): "Run a command in a new Docker container.",
+    ("docker", "compose"): "Manage multi-container Docker applications.",
+    ("kubectl", "get"): "Display one or many Kubernetes resources.",
+    ("kubectl", "apply"): "Apply a configuration to Kubernetes resources.",
+    ("kubectl", "logs"): "Print logs for a Kubernetes container.",
+    ("kubectl", "describe"): "Show details of a Kubernetes resource.",
+    ("npm", "install"): "Install npm package dependencies.",
+    ("npm", "run"): "Run an npm package script.",
+    ("pip", "install"): "Install Python packages with pip.",
+    ("cargo", "build"): "Compile a Rust package with cargo.",
+    ("cargo", "test"): "Run tests of a Rust package with cargo.",
+    ("systemctl", "status"): "Show runtime status of systemd units.",
+    ("systemctl", "restart"): "Restart systemd units.",
+    ("apt", "install"): "Install packages with the APT package manager.",
+    ("apt-get", "install"): "Install packages with the APT package manager.",
+    ("brew", "install"): "Install packages with Homebrew.",
+    ("grep",): "Search text using patterns.",
+    ("find",): "Search for files in a directory hierarchy.",
+    ("curl",): "Transfer data from or to a server by URL.",
+    ("wget",): "Download files from the web.",
+    ("tar",): "Archive or extract files with tar.",
+    ("ssh",): "Log in to a remote machine over SSH.",
+    ("scp",): "Copy files between hosts over SSH.",
+    ("rsync",): "Synchronize files and directories between locations.",
+    ("make",): "Run build targets from a Makefile.",
+    ("ps",): "Report a snapshot of current processes.",
+    ("top",): "Display system processes and resource usage.",
+    ("df",): "Report filesystem disk space usage.",
+    ("du",): "Estimate file and directory space usage.",
+    ("chmod",): "Change file mode bits (permissions).",
+    ("chown",): "Change file owner and group.",
+    ("kill",): "Send a signal to a process.",
+}
+
+def _builtin_lookup(canonical):
+    """命中返回描述字符串，未命中返回 None。先查 (首词, 子命令) 再回落首词。"""
+    argv = canonical.split(None, 2)
+    if len(argv) >= 2 and not argv[1].startswith('-'):
+        hit = BUILTIN_DESCRIPTIONS.get((argv[0], argv[1]))
+        if hit is not None:
+            return hit
+    return BUILTIN_DESCRIPTIONS.get((argv[0],))
 
 # --- LLM 处理 ---
-# 假设你有一个 LLM 客户端 llm_client
+# LLM 调用是纯网络等待，串行跑 N 条就是 N × RTT；改成协程后同一批内
+# 并发等待，墙钟时间 ≈ 单次延迟。真实实现用 httpx.AsyncClient 或
+# openai.AsyncOpenAI 发请求即可，签名不变。
 # llm_client = get_llm_client()
 
-def llm_generate_description(command_text):
-    # prompt = f"..." (如上文设计)
-    # response = llm_client.generate(prompt)
-    # return response.text
-    # 模拟LLM调用
-    print(f"LLM: Generating description for '{command_text[:30]}...'")
-    time.sleep(0.1) # 模拟网络延迟
-    return f"This is a generated description for: {command_text}"
-
-def llm_rewrite_command(command_text):
-    # prompt = f"..." (如上文设计)
-    # response = llm_client.generate(prompt)
-    # return response.text
+async def llm_process_command(command_text):
+    """
+    一次往返同时产出描述和改写：原来描述 + 改写要两次请求，系统提示词和
+    命令文本等前缀 token 也要付两遍；合并后请求数和前缀 token 都减半。
+    让模型返回 {"description": ..., "processed_command": ...} 的 JSON
+    （OpenAI 可加 response_format={"type": "json_object"} 强制结构化输出），
+    再 json.loads 解析。
+    """
+    # prompt = f"Return JSON with keys description and processed_command for: {command_text}"
+    # response = await llm_client.generate(prompt)
+    # return json.loads(response.text)
     # 模拟LLM调用
-    print(f"LLM: Rewriting command for '{command_text[:30]}...'")
-    time.sleep(0.1)
-    return command_text # 简单返回原始命令
+    log.debug("LLM: Processing '%s...'", command_text[:30])
+    await asyncio.sleep(0.1) # 模拟网络延迟
+    return {
+        "description": f"This is a generated description for: {command_text}",
+        "processed_command": command_text, # 简单返回原始命令
+    }
+
+# 瞬时故障（429/5xx/超时）重试上限与退避上限。真实客户端下等价于 tenacity:
+# @retry(stop=stop_after_attempt(6), wait=wait_random_exponential(min=1, max=30),
+#        retry=retry_if_exception_type((httpx.HTTPStatusError, httpx.TimeoutException)))
+LLM_MAX_ATTEMPTS = 6
+LLM_BACKOFF_MAX_SECONDS = 30.0
+
+class LLMTransientError(Exception):
+    """可重试的 LLM 调用失败；真实实现里对应 429/5xx 响应和网络超时。"""
+
+_RETRYABLE_LLM_ERRORS = (LLMTransientError, asyncio.TimeoutError)
+
+async def _llm_call_with_retry(command_text):
+    """
+    带抖动指数退避的重试：没有它，一次瞬时 429/5xx 就会让整个导入中途
+    崩掉，前面付过的 token 全部作废。退避加随机抖动避免一批协程
+    同步醒来再次打满限额。
+    """
+    for attempt in range(LLM_MAX_ATTEMPTS):
+        try:
+            return await llm_process_command(command_text)
+        except _RETRYABLE_LLM_ERRORS:
+            if attempt == LLM_MAX_ATTEMPTS - 1:
+                raise
+            delay = random.uniform(1.0, min(LLM_BACKOFF_MAX_SECONDS, 2.0 ** attempt + 1.0))
+            await asyncio.sleep(delay)
+
+async def _llm_process_one(semaphore, raw_cmd):
+    """Semaphore 控制全局在途请求数，让 gather 的并发洪峰不会自己制造 429。"""
+    async with semaphore:
+        result = await _llm_call_with_retry(raw_cmd)
+    return result["description"], result["processed_command"]
+
+def submit_llm_batch(commands_to_process, source_name):
+    """
+    把去重后的全部命令写成 Batch API 的 JSONL（每行一个 /v1/chat/completions
+    请求），上传并提交批任务，把 batch id 和 custom_id -> 命令 的映射落盘，
+    等 `init --resume` 再取结果。不需要任何重试/退避逻辑。
+    """
+    id_map = {}
+    lines = []
+    for canonical, hist_ts in commands_to_process:
+        custom_id = str(uuid.uuid4())
+        id_map[custom_id] = {"canonical": canonical, "history_timestamp": hist_ts}
+        lines.append(json.dumps({
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": "gpt-4o-mini",
+                "response_format": {"type": "json_object"},
+                "messages": [{
+                    "role": "user",
+                    "content": f"Return JSON with keys description and processed_command for: {canonical}",
+                }],
+            },
+        }))
+    BATCH_INPUT_PATH.parent.mkdir(parents=True, exist_ok=True)
+    BATCH_INPUT_PATH.write_text("\n".join(lines) + "\n")
+
+    # 真实实现:
+    # input_file = client.files.create(file=BATCH_INPUT_PATH.open("rb"), purpose="batch")
+    # batch = client.batches.create(input_file_id=input_file.id,
+    #                               endpoint="/v1/chat/completions",
+    #                               completion_window="24h")
+    # batch_id = batch.id
+    batch_id = f"batch_{uuid.uuid4().hex}" # 模拟提交
+
+    BATCH_STATE_PATH.write_text(json.dumps({
+        "batch_id": batch_id,
+        "source": source_name,
+        "commands": id_map,
+    }))
+    print(f"Submitted batch {batch_id} with {len(lines)} commands. "
+          f"Run with resume=True once the batch completes (up to 24h).")
+    return batch_id
+
+def resume_batch_import():
+    """下载已完成批任务的输出文件，解析每行的 JSON 结果并入库。"""
+    if not BATCH_STATE_PATH.exists():
+        print("No pending batch to resume.")
+        return 0
+    state = json.loads(BATCH_STATE_PATH.read_text())
+
+    # 真实实现:
+    # batch = client.batches.retrieve(state["batch_id"])
+    # if batch.status != "completed":
+    #     print(f"Batch {state['batch_id']} is still {batch.status}.")
+    #     return 0
+    # output_lines = client.files.content(batch.output_file_id).text.splitlines()
+    # results = {}
+    # for line in output_lines:
+    #     row = json.loads(line)
+    #     content = row["response"]["body"]["choices"][0]["message"]["content"]
+    #     results[row["custom_id"]] = json.loads(content)
+
+    command_rows = []
+    occurrence_pairs = [] # (canonical, history_timestamp)
+    for custom_id, info in state["commands"].items():
+        # data = results[custom_id]
+        data = { # 模拟批输出
+            "description": f"This is a generated description for: {info['canonical']}",
+            "processed_command": info["canonical"],
+        }
+        command_rows.append((info["canonical"], data["description"], data["processed_command"]))
+        occurrence_pairs.append((info["canonical"], info["history_timestamp"]))
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        inserted = _insert_many(cursor, _COMMANDS_INSERT_PREFIX, 3, command_rows)
+        id_map = {}
+        canonicals = [canonical for canonical, _ in occurrence_pairs]
+        for start in range(0, len(canonicals), _MAX_BIND_PARAMS):
+            part = canonicals[start:start + _MAX_BIND_PARAMS]
+            id_map.update(cursor.execute(
+                "SELECT canonical, id FROM commands WHERE canonical IN (%s)"
+                % ", ".join(["?"] * len(part)),
+                part
+            ).fetchall())
+        _insert_many(cursor, _OCCURRENCES_INSERT_PREFIX, 3,
+                     [(id_map[canonical], state["source"], hist_ts)
+                      for canonical, hist_ts in occurrence_pairs])
+        conn.commit()
+        create_indexes(conn) # 批结果入库同属首次导入，索引同样事后补建
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"Database error during batch import: {e}")
+        inserted = 0
+    conn.close()
+    BATCH_STATE_PATH.unlink()
+    print(f"Batch import complete. Inserted {inserted} commands.")
+    return inserted
+
+async def _llm_process_chunk(commands_chunk):
+    """commands_chunk: [(raw_cmd, hist_ts), ...] -> [(raw_cmd, hist_ts, desc, processed), ...]"""
+    semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    results = await asyncio.gather(
+        *(_llm_process_one(semaphore, raw_cmd) for raw_cmd, _ in commands_chunk)
+    )
+    return [
+        (raw_cmd, hist_ts, description, processed_cmd)
+        for (raw_cmd, hist_ts), (description, processed_cmd)
+        in zip(commands_chunk, results)
+    ]
+
+def _llm_process_chunk_threaded(commands_chunk):
+    """
+    同步 SDK 的替代并发路径：选用的 LLM 客户端没有 async 版本时
+    （无 AsyncOpenAI），asyncio 改写不适用，但调用仍是纯网络等待、
+    阻塞期间释放 GIL，线程池拿到同样的并发度。返回形状与
+    _llm_process_chunk 一致且按输入顺序；换成同步 SDK 时把主循环里的
+    asyncio.run(_llm_process_chunk(...)) 替换为这一个调用即可。
+    线程数复用 LLM_MAX_CONCURRENCY——在途请求上限是限流属性，
+    与用哪种并发原语无关。
+    """
+    def process_one(task):
+        raw_cmd, hist_ts = task
+        # 真实实现：result = sync_llm_client.generate(...)，外面套与
+        # _llm_call_with_retry 相同的重试/退避；这里借协程版模拟阻塞调用。
+        result = asyncio.run(_llm_call_with_retry(raw_cmd))
+        return raw_cmd, hist_ts, result["description"], result["processed_command"]
+
+    with ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENCY) as executor:
+        return list(executor.map(process_one, commands_chunk))
 
 # --- 主初始化逻辑 (可以放在 Typer 命令中) ---
-def initialize_from_history(shell_type: str = "bash"):
+def initialize_from_history(shell_type: str = "bash", batch_mode: bool = False, resume: bool = False):
+    if resume:
+        resume_batch_import()
+        return
     if shell_type == "bash":
-        hist_file = Path.home() / ".bash_history"
-        parsed_commands = parse_bash_history(hist_file)
+        parsed_commands = parse_bash_history(_default_history_file("bash"))
         source_name = "bash_history"
     elif shell_type == "zsh":
-        hist_file_env = os.getenv("HISTFILE")
-        hist_file = Path(hist_file_env) if hist_file_env else Path.home() / ".zsh_history"
-        parsed_commands = parse_zsh_history(hist_file)
+        parsed_commands = parse_zsh_history(_default_history_file("zsh"))
         source_name = "zsh_history"
     else:
         print(f"Unsupported shell type: {shell_type}")
         return
 
-    if not parsed_commands:
-        print("No commands found in history.")
-        return
-
-    print(f"Found {len(parsed_commands)} commands in {shell_type} history.")
-
-    # 预过滤和初步去重 (基于原始文本)
-    unique_raw_commands = {} # {cmd_text: earliest_timestamp}
+    # 单趟消费生成器：过滤 + 去重在同一个循环里完成，
+    # 不再先物化整个 history 的 list 再二次建 dict。
+    total_lines = 0
+    unique_commands = {} # {canonical_text: earliest_timestamp}
     for cmd_info in parsed_commands:
+        total_lines += 1
         cmd_text = cmd_info['text']
-        # 排除逻辑
-        first_word = cmd_text.split(' ')[0]
-        if cmd_text in DEFAULT_EXCLUDE_COMMANDS or \
-           first_word in DEFAULT_EXCLUDE_COMMANDS or \
-           len(cmd_text) < 5: # 简单长度过滤
+        # 排除逻辑：最便宜的定长检查在前（长度、注释行的首字符），
+        # 预编译正则扫描在后；全部通过才轮到下面的哈希 + dict 建条目。
+        if len(cmd_text) < 5 or cmd_text[0] == '#':
             continue
-        
-        # 保留最早的时间戳
-        if cmd_text not in unique_raw_commands or \
-           (cmd_info['timestamp'] and (unique_raw_commands[cmd_text] is None or cmd_info['timestamp'] < unique_raw_commands[cmd_text])):
-            unique_raw_commands[cmd_text] = cmd_info['timestamp']
+        if _EXCLUDE_RE.match(cmd_text):
+            continue
+
+        # 按规范形去重：多余空白折叠后 "ls -la  /tmp" 和 "ls -la /tmp"
+        # 只算一条，LLM 调用随之减少（shell history 里这类重复占比很高）。
+        # 入库的就是规范形；时间戳保留最早的。
+        canonical = ' '.join(cmd_text.split())
+        ts = cmd_info['timestamp']
+        if canonical not in unique_commands:
+            unique_commands[canonical] = ts
+        elif ts is not None:
+            prev = unique_commands[canonical]
+            if prev is None or ts < prev:
+                unique_commands[canonical] = ts
 
-    commands_to_process = list(unique_raw_commands.items())
+    if not total_lines:
+        print("No commands found in history.")
+        return
+
+    print(f"Found {total_lines} commands in {shell_type} history.")
+    commands_to_process = list(unique_commands.items()) # [(canonical, earliest_ts)]
     print(f"After pre-filtering and deduplication, {len(commands_to_process)} commands to process.")
 
+    # 大批量走 Batch API（半价、免限流）；小批量提交批任务不划算，回落在线路径
+    if batch_mode and len(commands_to_process) >= BATCH_MIN_COMMANDS:
+        submit_llm_batch(commands_to_process, source_name)
+        return
+
     conn = get_db_connection()
-    llm_processed_batch = []
-    total_actually_inserted = 0
-
-    for i, (raw_cmd, hist_ts) in enumerate(commands_to_process):
-        print(f"Processing command {i+1}/{len(commands_to_process)}: {raw_cmd[:50]}...")
-        
-        # 模拟LLM处理（实际中应有错误处理和重试）
-        description = llm_generate_description(raw_cmd)
-        processed_cmd = llm_rewrite_command(raw_cmd)
-
-        llm_processed_batch.append((
-            str(uuid.uuid4()),
-            raw_cmd,
-            processed_cmd,
-            description,
-            source_name,
-            hist_ts
-        ))
-
-        if len(llm_processed_batch) >= LLM_BATCH_SIZE or (i + 1) == len(commands_to_process):
-            print(f"Inserting batch of {len(llm_processed_batch)} commands into database...")
-            inserted_count = insert_command_batch(conn, llm_processed_batch)
-            total_actually_inserted += inserted_count
-            print(f"Actually inserted {inserted_count} new commands from this batch.")
-            llm_processed_batch = []
-            time.sleep(0.5) # 避免过于频繁的DB写入或API调用
+    # 空表 = 首次批量导入：二级索引留到导入完成后一次性构建；
+    # 非空表走增量路径，先确保索引在位，让本次插入照常维护它们。
+    is_initial_import = conn.execute(
+        "SELECT 1 FROM commands LIMIT 1"
+    ).fetchone() is None
+    if not is_initial_import:
+        create_indexes(conn)
+    total_new_commands = 0
+    total_new_occurrences = 0
+
+    # 整个导入一个事务：每批 commit 一次就是每批一次 fsync，
+    # 合并后上千行也只付一次持久化成本。
+    # llm_cache 走独立连接（独立文件）、每批立即 commit：它是断点续传的
+    # 检查点，必须在主事务之外持久化——否则第 8000 条崩掉会把前面付过钱
+    # 的 LLM 结果一起回滚，下次重跑全部重付。WAL 下批级 commit 很便宜，
+    # 重跑/Ctrl-C 后这些命令直接命中缓存跳过 LLM。
+    cache_conn = get_llm_cache_connection()
+
+    try:
+        conn.execute("BEGIN")
+        cursor = conn.cursor() # 跨批复用，executemany 的预编译语句留在缓存里
+
+        # 按批切分，批内用 asyncio.gather 并发所有 LLM 调用（实际中应有错误处理和重试）；
+        # API 限流由 _llm_process_one 里的 Semaphore 负责，不再靠批间 sleep。
+        for i in range(0, len(commands_to_process), LLM_BATCH_SIZE):
+            chunk = commands_to_process[i:i + LLM_BATCH_SIZE]
+            log.debug("Processing commands %d-%d/%d", i + 1, i + len(chunk), len(commands_to_process))
+
+            canonicals = [canonical for canonical, _ in chunk]
+            in_sql = ", ".join(["?"] * len(canonicals))
+
+            # 第一层去重：commands 里已有的规范形（上一轮导入或另一个 shell
+            # 的 history 已经付过费）连缓存查询都省掉，只补出现记录。
+            known = {row[0] for row in cursor.execute(
+                f"SELECT canonical FROM commands WHERE canonical IN ({in_sql})",
+                canonicals
+            )}
+
+            # 第二层：内置描述表（零成本）；第三层：内容寻址缓存；
+            # 只有三层全未命中的命令才发给 LLM。
+            cmd_hashes = {canonical: hashlib.sha256(canonical.encode()).digest()
+                          for canonical in canonicals if canonical not in known}
+            cached_results = []
+            cache_misses = []
+            for canonical, hist_ts in chunk:
+                if canonical in known:
+                    continue
+                builtin_desc = _builtin_lookup(canonical)
+                if builtin_desc is not None:
+                    cached_results.append((canonical, hist_ts, builtin_desc, canonical))
+                    continue
+                row = cache_conn.execute(
+                    "SELECT description, processed FROM llm_cache WHERE cmd_hash = ?",
+                    (cmd_hashes[canonical],)
+                ).fetchone()
+                if row is not None:
+                    cached_results.append((canonical, hist_ts, row[0], row[1]))
+                else:
+                    cache_misses.append((canonical, hist_ts))
+
+            fresh_results = asyncio.run(_llm_process_chunk(cache_misses)) if cache_misses else []
+            if fresh_results:
+                # 检查点：新结果立刻经 cache_conn 落盘并 commit，
+                # 与主事务无关，崩溃/中断也不丢失
+                cache_conn.executemany(
+                    "INSERT OR REPLACE INTO llm_cache (cmd_hash, description, processed) VALUES (?, ?, ?)",
+                    [(cmd_hashes[canonical], description, processed_cmd)
+                     for canonical, _, description, processed_cmd in fresh_results]
+                )
+                cache_conn.commit()
+
+            total_new_commands += _insert_many(
+                cursor, _COMMANDS_INSERT_PREFIX, 3,
+                [(canonical, description, processed_cmd)
+                 for canonical, _, description, processed_cmd
+                 in cached_results + fresh_results]
+            )
+
+            # 规范形 -> id 整块查回一次，再批量插出现记录；
+            # UNIQUE (cmd_id, source) 让重复导入同一来源成为无操作。
+            id_map = dict(cursor.execute(
+                f"SELECT canonical, id FROM commands WHERE canonical IN ({in_sql})",
+                canonicals
+            ).fetchall())
+            total_new_occurrences += _insert_many(
+                cursor, _OCCURRENCES_INSERT_PREFIX, 3,
+                [(id_map[canonical], source_name, hist_ts)
+                 for canonical, hist_ts in chunk]
+            )
+            # 用户可见的进度：每批只原地刷新一行，而不是每条命令几行输出
+            print(f"\rProcessed {i + len(chunk)}/{len(commands_to_process)} commands...",
+                  end="", flush=True)
+
+        print() # 结束进度行
+        conn.commit()
+        if is_initial_import:
+            create_indexes(conn)
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"Database error, rolling back import: {e}")
+        total_new_commands = total_new_occurrences = 0
 
+    cache_conn.close()
     conn.close()
-    print(f"Initialization complete. Total new commands added to database: {total_actually_inserted}")
+    print(f"Initialization complete. {total_new_commands} new commands, "
+          f"{total_new_occurrences} new occurrences added to database.")
 
 # if __name__ == "__main__":
 #     # 这是一个简化的测试调用，实际中会通过 Typer CLI 调用
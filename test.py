@@ -18,8 +18,12 @@ def greet(
         typer.echo(f"Verbose mode enabled.") # typer.echo is like print but with more features
         typer.echo(f"Received arguments: name='{name}', greeting='{greeting}', times={times}")
 
-    for _ in range(times):
-        typer.secho(f"{greeting}, {name}!", fg=typer.colors.GREEN) # secho allows styling
+    # Style once and emit all copies in a single write: secho per iteration
+    # recomputes the ANSI escapes and flushes stdout every time, which is
+    # pure overhead for large --times.
+    if times > 0:
+        styled = typer.style(f"{greeting}, {name}!", fg=typer.colors.GREEN)
+        typer.echo("\n".join([styled] * times))
 
     if verbose:
         typer.echo("Greeting complete.")